@@ -0,0 +1,342 @@
+"""
+Benchmarks for DocuSim: startup, text analysis, planning and the typing hot path. Runs offline against
+synthetic documents with fixed seeds; every case runs in a fresh process so its peak memory is its own.
+
+    python benchmarks.py                              # every benchmark, 1 KB to 10 MB (takes several minutes)
+    python benchmarks.py --only plan_document type_sentence --sizes 1000 100000 --repeat 5
+    python benchmarks.py --save baseline.json         # record a baseline
+    python benchmarks.py --compare baseline.json      # exits 1 if any benchmark got slower than --threshold
+"""
+import time
+import random
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import multiprocessing
+import platform
+import sys
+import tempfile
+
+import docusim
+
+BASELINE_VERSION = 1
+SINGLE_RUN_SIZE = 1_000_000 # Documents this large are timed once instead of best-of-repeat
+
+# --- Synthetic Documents ---
+
+_VOCABULARY = (
+    "the of and to a in is was that for it with as his on be at by this had not are but from or have an they "
+    "which one you were her all she there would their we him been has when who will more no if out so said what "
+    "up its about into than them can only other new some could time these two may then do first any my now such "
+    "like our over man me even most made after also did many before must through back years where much your way "
+    "well down should because each just those people how too little state good very make world still own see men "
+    "work long get here between both life being under never day same another know while last might us great old "
+    "year off come since against go came right used take three revision history document evidence keyboard "
+    "simulation forensic quixotic ephemeral labyrinthine idiosyncratic"
+).split()
+
+
+def make_document(size_bytes, seed=0):
+    """Returns a deterministic English-like document of roughly size_bytes characters."""
+    rng = random.Random(seed); paragraphs = []; total = 0
+    while total < size_bytes:
+        sentences = []
+        for _ in range(rng.randint(2, 8)):
+            words = rng.choices(_VOCABULARY, k=rng.randint(4, 24))
+            for i in range(1, len(words) - 1):
+                if rng.random() < 0.08: words[i] += ","
+            words[0] = words[0].capitalize()
+            sentences.append(" ".join(words) + rng.choice(".....?!"))
+        paragraph = " ".join(sentences); paragraphs.append(paragraph); total += len(paragraph) + 1
+    return "\n".join(paragraphs)[:max(size_bytes, 1)]
+
+
+def _format_size(size_bytes):
+    if size_bytes is None: return "-"
+    for unit, scale in (("MB", 1_000_000), ("KB", 1_000)):
+        if size_bytes >= scale: return f"{size_bytes / scale:g}{unit}"
+    return f"{size_bytes}B"
+
+
+def _best_of(fn, repeat):
+    """Runs fn repeat times and returns (best seconds, last result)."""
+    best = float("inf"); result = None
+    for _ in range(repeat):
+        start = time.perf_counter(); result = fn(); best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def _peak_rss_mb():
+    """Peak resident memory of this process in MB, or None where the resource module is unavailable."""
+    try: import resource
+    except ImportError: return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1e6 if sys.platform == "darwin" else peak / 1e3 # Bytes on macOS, KB elsewhere
+
+
+def _measure(benchmark, variant, size, fn, repeat):
+    """Times fn (which returns an item count) and records how much it raised this process's peak memory."""
+    before = _peak_rss_mb()
+    if size is not None and size >= SINGLE_RUN_SIZE: repeat = 1
+    seconds, items = _best_of(fn, repeat)
+    after = _peak_rss_mb()
+    return {"benchmark": benchmark, "variant": variant, "size_bytes": size, "seconds": seconds, "items": items,
+            "items_per_second": items / seconds if seconds else 0.0,
+            "memory_mb": after - before if before is not None else None, "peak_rss_mb": after}
+
+
+class NullSink(docusim.OutputSink):
+    """Discards keystrokes, so typing benchmarks time planning and dispatch only."""
+    def press(self, key): pass
+    def release(self, key): pass
+
+
+class StandInSink(NullSink):
+    """
+    Stand-in for a real keyboard backend: every press and every release pays call_cost, in tap_batch
+    too (PynputSink.tap_batch still makes two controller calls per key), so the batched/per-key gap
+    is only what batching saves in the dispatcher.
+    """
+    def __init__(self, call_cost=20e-6): self.call_cost = call_cost
+
+    def _send(self):
+        end = time.perf_counter() + self.call_cost
+        while time.perf_counter() < end: pass
+
+    def press(self, key): self._send()
+    def release(self, key): self._send()
+
+    def tap_batch(self, keys, delays, wait):
+        send = self._send
+        for i in range(len(keys)): send(); send(); self.batch_sent = i + 1; wait(delays[i])
+
+
+def _sentences(text):
+    import nltk
+    return [s for paragraph in text.split("\n") if paragraph.strip() for s in nltk.sent_tokenize(paragraph)]
+
+
+# --- Benchmarks ---
+# Each takes (size, seed, repeat) and returns a list of result dicts; size is None for unsized ones.
+
+def bench_ensure_nltk_data(size, seed, repeat):
+    """Startup NLTK data check (the cached-manifest fast path once data is installed)."""
+    def run():
+        with contextlib.redirect_stdout(io.StringIO()): docusim.ensure_nltk_data()
+        return 1
+    return [_measure("ensure_nltk_data", "manifest", None, run, repeat)]
+
+
+def bench_load_word_frequencies(size, seed, repeat):
+    """Opening the cached frequency table vs rebuilding it from the Brown corpus."""
+    docusim.load_word_frequencies() # Make sure the cache exists before timing the cached path
+    def load(**kwargs):
+        with contextlib.redirect_stdout(io.StringIO()): table = docusim.load_word_frequencies(**kwargs)
+        return len(table)
+    results = [_measure("load_word_frequencies", "cached", None, load, repeat)]
+    with tempfile.TemporaryDirectory() as cache_dir: # Never touch the user's cache
+        results.append(_measure("load_word_frequencies", "rebuild", None,
+                                lambda: load(cache_dir=cache_dir, rebuild=True), repeat))
+    return results
+
+
+def _mapping_mb(mapping):
+    """Size in MB of a str->int mapping's dict, key and (distinct) value objects."""
+    values = {id(v): v for v in mapping.values()}
+    total = sys.getsizeof(mapping) + sum(map(sys.getsizeof, mapping)) + sum(map(sys.getsizeof, values.values()))
+    return total / 1e6
+
+
+def bench_word_frequency_store(size, seed, repeat):
+    """Memory and get() cost of the compact frequency table vs the full corpus dict, over the document's words."""
+    with contextlib.redirect_stdout(io.StringIO()): full = docusim._build_word_frequencies()
+    words = [word.lower() for word in make_document(size, seed).split()]
+    def lookups(store):
+        get = store.get
+        def run():
+            for word in words: get(word, 1)
+            return len(words)
+        return run
+    with tempfile.TemporaryDirectory() as cache_dir:
+        path = f"{cache_dir}/word_freq.bin"
+        docusim.write_word_frequency_table(path, full, "0" * 40); table = docusim.WordFrequencyTable(path)
+        results = []
+        for variant, store, mapping in (("dict", full, full), ("compact", table, table._counts)):
+            result = _measure("word_frequency_store", variant, size, lookups(store), repeat)
+            result["memory_mb"] = _mapping_mb(mapping); results.append(result)
+    return results
+
+
+def bench_sent_tokenize(size, seed, repeat):
+    import nltk
+    paragraphs = [p for p in make_document(size, seed).split("\n") if p.strip()]
+    nltk.sent_tokenize("Warm up. This loads the tokenizer.")
+    return [_measure("sent_tokenize", "punkt", size,
+                     lambda: sum(len(nltk.sent_tokenize(p)) for p in paragraphs), repeat)]
+
+
+def bench_sentence_complexity(size, seed, repeat):
+    sentences = _sentences(make_document(size, seed))
+    def run():
+        for sentence in sentences: docusim.calculate_sentence_complexity(sentence)
+        return len(sentences)
+    return [_measure("sentence_complexity", "-", size, run, repeat)]
+
+
+def bench_adjacent_key(size, seed, repeat):
+    chars = [c for c in make_document(size, seed) if c.isalpha()]
+    def run():
+        rng = random.Random(seed)
+        for c in chars: docusim.get_adjacent_key(c, rng)
+        return len(chars)
+    return [_measure("get_adjacent_key", "-", size, run, repeat)]
+
+
+def bench_type_word(size, seed, repeat):
+    """type_word on every word of the document against a no-op sink and a virtual clock."""
+    words = make_document(size, seed).split(); word_freq = docusim.load_word_frequencies()
+    sink = NullSink(); clock = docusim.VirtualClock()
+    def run():
+        random.seed(seed)
+        for word in words: docusim.type_word(word, sink, word_freq, 0.015, 0.025, 1.0, clock)
+        return len(words)
+    return [_measure("type_word", "null sink", size, run, repeat)]
+
+
+def bench_type_sentence(size, seed, repeat):
+    """type_sentence on every sentence of the document against a no-op sink and a virtual clock."""
+    sentences = _sentences(make_document(size, seed)); word_freq = docusim.load_word_frequencies()
+    sink = NullSink(); clock = docusim.VirtualClock()
+    def run():
+        random.seed(seed)
+        for sentence in sentences: docusim.type_sentence(sentence, sink, word_freq, 0.5, 2, 5, 0.015, 0.025, 1.0, clock)
+        return len(sentences)
+    return [_measure("type_sentence", "null sink", size, run, repeat)]
+
+
+def bench_planning(size, seed, repeat):
+    """plan_document on an analyzed document, scalar vs NumPy batch sampling (vectorized is skipped without NumPy)."""
+    word_freq = docusim.load_word_frequencies()
+    model = docusim.analyze_document(make_document(size, seed), word_freq) # Tokenizing is timed by sent_tokenize
+    try: import numpy # noqa: F401
+    except ImportError: samplings = (False,)
+    else: samplings = (False, True)
+    return [_measure("plan_document", "vectorized" if vectorized else "scalar", size,
+                     lambda: len(docusim.plan_document(model, word_freq, seed=seed, vectorized=vectorized)), repeat)
+            for vectorized in samplings]
+
+
+def bench_dispatch(size, seed, repeat):
+    """dispatch_plan throughput (events/s at virtual-clock speed), per-key vs batched runs, on two sinks."""
+    word_freq = docusim.load_word_frequencies()
+    plan = docusim.plan_document(make_document(size, seed), word_freq, seed=seed)
+    def run(sink, batch):
+        with contextlib.redirect_stdout(io.StringIO()): docusim.dispatch_plan(plan, sink, docusim.VirtualClock(), batch=batch)
+        return len(plan)
+    return [_measure("dispatch_plan", f"{label} {'batch' if batch else 'key'}", size, lambda: run(sink, batch), repeat)
+            for label, sink in (("null", NullSink()), ("stand-in", StandInSink())) for batch in (False, True)]
+
+
+def bench_replay(size, seed, repeat):
+    """Replaying a document's plan into the in-memory editor (events/s), alone and with the full text check."""
+    text = make_document(size, seed); word_freq = docusim.load_word_frequencies()
+    plan = docusim.plan_document(text, word_freq, seed=seed)
+    def replay(): docusim.ReplayDocument().replay(plan).text(); return len(plan)
+    def verify(): docusim.verify_plan(plan, text); return len(plan)
+    return [_measure("replay_plan", "replay", size, replay, repeat), _measure("replay_plan", "verify", size, verify, repeat)]
+
+
+BENCHMARKS = { # name: (function, takes a document size)
+    "ensure_nltk_data": (bench_ensure_nltk_data, False),
+    "load_word_frequencies": (bench_load_word_frequencies, False),
+    "word_frequency_store": (bench_word_frequency_store, True),
+    "sent_tokenize": (bench_sent_tokenize, True),
+    "sentence_complexity": (bench_sentence_complexity, True),
+    "get_adjacent_key": (bench_adjacent_key, True),
+    "type_word": (bench_type_word, True),
+    "type_sentence": (bench_type_sentence, True),
+    "plan_document": (bench_planning, True),
+    "dispatch_plan": (bench_dispatch, True),
+    "replay_plan": (bench_replay, True),
+}
+
+
+def _run_case(name, size, seed, repeat):
+    return BENCHMARKS[name][0](size, seed, repeat)
+
+
+def run_benchmarks(names, sizes, seed=1234, repeat=3):
+    """Runs each benchmark (per size, if sized) in a fresh process; returns the combined result dicts."""
+    results = []; context = multiprocessing.get_context("spawn")
+    for name in names:
+        for size in (sizes if BENCHMARKS[name][1] else [None]):
+            print(f"Running {name}" + (f" ({_format_size(size)})" if size is not None else "") + "...", flush=True)
+            with context.Pool(1) as pool: results.extend(pool.apply(_run_case, (name, size, seed, repeat)))
+    return results
+
+
+# --- Reporting and Baselines ---
+
+def print_results(results):
+    print(f"\n{'benchmark':<22} {'variant':<14} {'size':>7} {'seconds':>10} {'items/s':>14} {'+memory MB':>10} {'peak MB':>8}")
+    for r in results:
+        memory = f"{r['memory_mb']:>10.1f} {r['peak_rss_mb']:>8.1f}" if r["memory_mb"] is not None else f"{'-':>10} {'-':>8}"
+        print(f"{r['benchmark']:<22} {r['variant']:<14} {_format_size(r['size_bytes']):>7} {r['seconds']:>10.4f} "
+              f"{r['items_per_second']:>14,.0f} {memory}")
+
+
+def save_baseline(path, results, seed, repeat):
+    data = {"version": BASELINE_VERSION, "created": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(), "platform": platform.platform(), "seed": seed,
+            "repeat": repeat, "results": results}
+    docusim.atomic_write_bytes(path, json.dumps(data, indent=1).encode("utf-8"))
+    print(f"\nBaseline saved to {path}.")
+
+
+def compare_baseline(path, results, threshold=0.10):
+    """Prints each result against the baseline at path; returns the number that got slower than threshold."""
+    with open(path, "r", encoding="utf-8") as f: baseline = json.load(f)
+    if baseline.get("version") != BASELINE_VERSION: print(f"Baseline {path} is from another version."); return 0
+    previous = {(r["benchmark"], r["variant"], r["size_bytes"]): r for r in baseline["results"]}
+    print(f"\nCompared with {path} ({baseline['created']}, Python {baseline['python']}):")
+    print(f"{'benchmark':<22} {'variant':<14} {'size':>7} {'baseline s':>11} {'now s':>10} {'change':>8}")
+    regressions = 0
+    for r in results:
+        old = previous.get((r["benchmark"], r["variant"], r["size_bytes"]))
+        if old is None: continue
+        change = r["seconds"] / old["seconds"] - 1 if old["seconds"] else 0.0
+        flag = ""
+        if change > threshold: flag = "  REGRESSED"; regressions += 1
+        print(f"{r['benchmark']:<22} {r['variant']:<14} {_format_size(r['size_bytes']):>7} {old['seconds']:>11.4f} "
+              f"{r['seconds']:>10.4f} {change:>+8.1%}{flag}")
+    print(f"{regressions} regression(s) over {threshold:.0%}." if regressions else "No regressions.")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark DocuSim startup, planning and typing.")
+    parser.add_argument("--only", nargs="+", choices=sorted(BENCHMARKS), default=list(BENCHMARKS),
+                        metavar="NAME", help=f"benchmarks to run (default: all of {', '.join(BENCHMARKS)})")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 100_000, 1_000_000, 10_000_000],
+                        help="document sizes in bytes")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help=f"runs per measurement, best is reported (documents from {_format_size(SINGLE_RUN_SIZE)} run once)")
+    parser.add_argument("--seed", type=int, default=1234, help="seed for documents and typing decisions")
+    parser.add_argument("--save", metavar="PATH", help="write results as a JSON baseline")
+    parser.add_argument("--compare", metavar="PATH", help="compare results with a saved baseline")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="slowdown (fraction) that counts as a regression in --compare (default 0.10)")
+    args = parser.parse_args(argv)
+
+    docusim.ensure_nltk_data()
+    docusim.load_word_frequencies() # Build the cache once up front so cases don't race to write it
+    results = run_benchmarks(args.only, args.sizes, args.seed, args.repeat)
+    print_results(results)
+    if args.save: save_baseline(args.save, results, args.seed, args.repeat)
+    if args.compare and compare_baseline(args.compare, results, args.threshold): sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,25 +1,101 @@
 import time
+_IMPORT_START = time.perf_counter() # For --profile-startup
 import random
-import pynput
-import nltk
-from nltk.corpus import brown, words
 import traceback # For better error reporting
+import os
+import struct
+import hashlib
+import tempfile
+import collections
+import types
+import array
+import math
+import json
+import argparse
+import bisect
+import contextlib
+import io
+import importlib
+import importlib.util
 import sys # To use exit()
 import datetime # For time formatting
 
 # --- NLTK Data Check and Download ---
-# (ensure_nltk_data function remains the same - included for completeness)
+NLTK_REQUIRED_DATA = [
+    ('corpora', 'brown'),
+    ('corpora', 'words'),
+    ('tokenizers', 'punkt')
+]
+NLTK_MANIFEST_VERSION = 1
+
+
+def _nltk_probe_path(dtype, dname):
+    """Returns the nltk.data.find() path used to verify a required data item."""
+    if dtype == 'corpora':
+        check_file = 'cats.txt' if dname == 'brown' else 'README'
+        return f'{dtype}/{dname}/{check_file}'
+    return f'{dtype}/{dname}'
+
+
+def _stat_fingerprint(path):
+    """Returns [abspath, size, mtime_ns] for path, used to detect changed files."""
+    st = os.stat(path)
+    return [os.path.abspath(path), st.st_size, st.st_mtime_ns]
+
+
+def _nltk_package_fingerprint():
+    """Fingerprints the installed nltk package without importing it."""
+    spec = importlib.util.find_spec('nltk')
+    if spec is None or not spec.origin: raise LookupError("nltk is not installed")
+    return _stat_fingerprint(spec.origin)
+
+
+def _nltk_manifest_path():
+    return os.path.join(get_cache_dir(), f"nltk_manifest_v{NLTK_MANIFEST_VERSION}.json")
+
+
+def load_nltk_manifest():
+    """Returns the cached manifest of verified NLTK data if nothing it records has changed, else None."""
+    try:
+        with open(_nltk_manifest_path(), "r", encoding="utf-8") as f: manifest = json.load(f)
+        if manifest.get("nltk_package") != _nltk_package_fingerprint(): return None
+        if manifest.get("nltk_data_env") != os.environ.get("NLTK_DATA"): return None
+        resources = manifest.get("resources", {})
+        for dtype, dname in NLTK_REQUIRED_DATA:
+            entry = resources.get(f"{dtype}/{dname}")
+            if not entry or _stat_fingerprint(entry[0]) != entry: return None
+        return manifest
+    except (OSError, ValueError, LookupError, TypeError, AttributeError):
+        return None
+
+
+def write_nltk_manifest():
+    """Records where each required NLTK data item was found so later launches can skip the probes."""
+    import nltk
+    resources = {}
+    for dtype, dname in NLTK_REQUIRED_DATA:
+        pointer = nltk.data.find(_nltk_probe_path(dtype, dname))
+        path = getattr(pointer, "path", None) or pointer.zipfile.filename # file/dir, or the zip it lives in
+        resources[f"{dtype}/{dname}"] = _stat_fingerprint(path)
+    manifest = {"nltk_package": _nltk_package_fingerprint(), "nltk_version": nltk.__version__,
+                "nltk_data_env": os.environ.get("NLTK_DATA"), "resources": resources}
+    atomic_write_bytes(_nltk_manifest_path(), json.dumps(manifest, indent=1).encode("utf-8"))
+    return manifest
+
+
 def ensure_nltk_data(max_retries=3):
     """
     Downloads necessary NLTK data if not found. Checks all required data,
     attempts to download missing items, and retries the check up to max_retries.
     Exits the script if verification fails after all retries.
+    A valid cached manifest from an earlier successful check skips the probes entirely.
     """
-    required_data = [
-        ('corpora', 'brown'),
-        ('corpora', 'words'),
-        ('tokenizers', 'punkt')
-    ]
+    if load_nltk_manifest() is not None:
+        print("\n--- NLTK data verified (cached manifest). ---")
+        return True
+
+    import nltk
+    required_data = NLTK_REQUIRED_DATA
     retries = 0
 
     while retries < max_retries:
@@ -29,13 +105,7 @@ def ensure_nltk_data(max_retries=3):
         print(f"\n--- NLTK Data Check (Attempt {retries + 1}/{max_retries}) ---")
         for dtype, dname in required_data:
             try:
-                if dtype == 'corpora':
-                    check_file = 'cats.txt' if dname == 'brown' else 'README'
-                    nltk.data.find(f'{dtype}/{dname}/{check_file}')
-                elif dtype == 'tokenizers':
-                    nltk.data.find(f'{dtype}/{dname}')
-                else:
-                     nltk.data.find(f'{dtype}/{dname}')
+                nltk.data.find(_nltk_probe_path(dtype, dname))
                 print(f"  [OK] Found: {dname}")
             except LookupError:
                 print(f"  [MISSING] Data not found: {dname}")
@@ -47,6 +117,8 @@ def ensure_nltk_data(max_retries=3):
 
         if all_found_this_pass:
             print("--- All required NLTK data verified. ---")
+            try: write_nltk_manifest()
+            except Exception as manifest_err: print(f"Warning: Could not cache NLTK data manifest: {manifest_err}")
             return True
 
         if missing_items:
@@ -95,26 +167,149 @@ def format_duration(seconds):
     return " ".join(parts) if parts else "0s"
 
 
-def load_word_frequencies():
-    """Loads word frequencies from NLTK corpora."""
+# --- Word Frequency Cache ---
+# The Brown/words merge is built once and stored compactly: only words whose count changes their
+# typing-speed factor, with counts capped where the factor bottoms out. Later launches only stat the
+# corpora and read a few hundred KB into a small dict.
+
+FREQ_CACHE_MAGIC = b"DSWF"
+FREQ_CACHE_VERSION = 2
+FREQ_SATURATION = 1024 # Every count >= this gives the minimum factor (0.5), so it is stored as this
+_FREQ_HEADER = struct.Struct("<4sII40s") # magic, version, n_keys, source key; then uint16 counts, then keys
+
+
+def get_cache_dir():
+    """Returns DocuSim's cache directory ($DOCUSIM_CACHE_DIR, else XDG cache), creating it if needed."""
+    cache_dir = os.environ.get("DOCUSIM_CACHE_DIR") or os.path.join(
+        os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"), "docusim")
+    os.makedirs(cache_dir, exist_ok=True)
+    return cache_dir
+
+
+def atomic_write_bytes(path, data, durable=True):
+    """Writes data to path via a temp file + rename so readers never see a partial file (fsynced if durable)."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            if durable: f.flush(); os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try: os.unlink(tmp_path)
+        except OSError: pass
+        raise
+
+
+def _data_fingerprint(path):
+    """Fingerprints a corpus file or zip (path, size, mtime), or every file in a corpus directory."""
+    if not os.path.isdir(path): return ":".join(str(x) for x in _stat_fingerprint(path))
+    entries = sorted((e.name, e.stat().st_size, e.stat().st_mtime_ns) for e in os.scandir(path) if e.is_file())
+    return f"{os.path.abspath(path)}:" + hashlib.sha1(repr(entries).encode("utf-8")).hexdigest()
+
+
+def _word_frequency_source_key():
+    """Fingerprints the corpus data (Brown files, the words list) and NLTK version the table is built from."""
+    manifest = load_nltk_manifest() or write_nltk_manifest() # Manifest hit avoids importing nltk; it locates the corpora
+    parts = [f"format={FREQ_CACHE_VERSION}", f"nltk={manifest['nltk_version']}"]
+    for resource, data_file in (("corpora/brown", None), ("corpora/words", "en")):
+        found = manifest["resources"][resource][0] # The probe file, or the zip holding the corpus
+        if not found.endswith(".zip"):
+            found = os.path.dirname(found)
+            if data_file: found = os.path.join(found, data_file)
+        parts.append(f"{resource}={_data_fingerprint(found)}")
+    return hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest()
+
+
+def _build_word_frequencies():
+    """Builds the frequency dict from NLTK corpora (Brown counts, words.words() entries default to 1)."""
+    import nltk
+    from nltk.corpus import brown, words
+    word_list_set = set(w.lower() for w in words.words())
+    brown_freq = nltk.FreqDist(w.lower() for w in brown.words())
+    freq_dict = {}
+    for word, freq in brown_freq.items(): freq_dict[word] = freq
+    for word in word_list_set:
+        if word not in freq_dict: freq_dict[word] = 1
+    if not freq_dict: raise ValueError("Frequency dictionary empty after loading.")
+    return freq_dict
+
+
+def compact_word_frequencies(freq_dict):
+    """
+    Drops entries that don't affect word_frequency_factor (count 1 gives the same factor as a missing
+    word) and caps counts at FREQ_SATURATION; factors are unchanged for every word.
+    """
+    return {word: min(int(count), FREQ_SATURATION) for word, count in freq_dict.items()
+            if count > 1 and word and "\n" not in word}
+
+
+def write_word_frequency_table(path, freq_dict, source_key):
+    """Serializes freq_dict (compacted) as a table file readable by WordFrequencyTable."""
+    compact = compact_word_frequencies(freq_dict); words = sorted(compact)
+    counts = array.array("H", map(compact.__getitem__, words))
+    if sys.byteorder == "big": counts.byteswap() # Stored little-endian
+    header = _FREQ_HEADER.pack(FREQ_CACHE_MAGIC, FREQ_CACHE_VERSION, len(words), source_key.encode("ascii"))
+    atomic_write_bytes(path, header + counts.tobytes() + "\n".join(words).encode("utf-8"))
+
+
+class WordFrequencyTable:
+    """
+    Read-only, dict-style word frequencies loaded from a table file. Holds only words with count > 1
+    (counts capped at FREQ_SATURATION), so get(word, 1) gives the same factor as the full corpus
+    dict at a tenth of the memory; get is the underlying dict's own get.
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as f: data = f.read()
+        try:
+            magic, version, n_keys, key = _FREQ_HEADER.unpack_from(data, 0)
+        except struct.error: raise ValueError(f"Truncated frequency table: {path}")
+        if magic != FREQ_CACHE_MAGIC or version != FREQ_CACHE_VERSION:
+            raise ValueError(f"Unsupported frequency table format: {path}")
+        counts = array.array("H"); counts_end = _FREQ_HEADER.size + 2 * n_keys
+        counts.frombytes(data[_FREQ_HEADER.size:counts_end])
+        if sys.byteorder == "big": counts.byteswap()
+        words = data[counts_end:].decode("utf-8").split("\n") if n_keys else []
+        if len(counts) != n_keys or len(words) != n_keys: raise ValueError(f"Truncated frequency table: {path}")
+        values = range(FREQ_SATURATION + 1) # Shared int objects instead of one per word
+        self._counts = dict(zip(words, map(values.__getitem__, counts)))
+        self.get = self._counts.get
+        self.source_key = key.decode("ascii"); self.path = path
+
+    def __reduce__(self): return (WordFrequencyTable, (self.path,)) # Pickles as its path: workers reload the cached file
+
+    def __getitem__(self, word): return self._counts[word]
+    def __contains__(self, word): return word in self._counts
+    def __len__(self): return len(self._counts)
+    def close(self): self._counts = {}; self.get = self._counts.get
+
+
+def load_word_frequencies(cache_dir=None, rebuild=False):
+    """Loads word frequencies, reusing the on-disk table unless it is missing, stale or rebuild=True."""
     try:
-        word_list_set = set(w.lower() for w in words.words())
-        brown_freq = nltk.FreqDist(w.lower() for w in brown.words())
-        freq_dict = {}
-        for word, freq in brown_freq.items(): freq_dict[word] = freq
-        for word in word_list_set:
-            if word not in freq_dict: freq_dict[word] = 1
-        if not freq_dict: raise ValueError("Frequency dictionary empty after loading.")
-        return freq_dict
+        path = os.path.join(cache_dir or get_cache_dir(), f"word_freq_v{FREQ_CACHE_VERSION}.bin")
+        source_key = _word_frequency_source_key()
+        if not rebuild and os.path.exists(path):
+            try:
+                table = WordFrequencyTable(path)
+                if table.source_key == source_key and len(table): return table
+                table.close(); print("Word frequency cache is stale, rebuilding...")
+            except (OSError, ValueError) as cache_err: print(f"Word frequency cache unreadable ({cache_err}), rebuilding...")
+        freq_dict = _build_word_frequencies()
+        try:
+            write_word_frequency_table(path, freq_dict, source_key)
+            return WordFrequencyTable(path)
+        except (OSError, ValueError) as write_err:
+            print(f"\nWarning: Could not write word frequency cache: {write_err}")
+            return compact_word_frequencies(freq_dict)
     except Exception as e:
         print(f"\nERROR loading word frequencies: {e}")
         return {"the": 1000, "a": 500, "is": 300} # Minimal fallback
 
 
-def calculate_sentence_complexity(sentence):
-    """Calculates a simple sentence complexity score."""
-    words = sentence.split()
-    num_words = len(words)
+def calculate_sentence_complexity(sentence, num_words=None):
+    """Calculates a simple sentence complexity score. Pass num_words if the sentence is already split."""
+    if num_words is None: num_words = len(sentence.split())
     num_commas = sentence.count(',')
     num_periods = sentence.count('.')
     num_colons_semicolons = sentence.count(':') + sentence.count(';')
@@ -122,278 +317,1687 @@ def calculate_sentence_complexity(sentence):
     normalized_complexity = min(max(complexity, 5), 100)
     return normalized_complexity
 
-def get_adjacent_key(char):
+# QWERTY Layout (US standard): neighbouring keys used for wrong-key typos
+QWERTY_ADJACENT_KEYS = {
+    'q': ['w', 'a', 's', '1', '2'], 'w': ['q', 'e', 'a', 's', 'd', '2', '3'],
+    'e': ['w', 'r', 's', 'd', 'f', '3', '4'], 'r': ['e', 't', 'd', 'f', 'g', '4', '5'],
+    't': ['r', 'y', 'f', 'g', 'h', '5', '6'], 'y': ['t', 'u', 'g', 'h', 'j', '6', '7'],
+    'u': ['y', 'i', 'h', 'j', 'k', '7', '8'], 'i': ['u', 'o', 'j', 'k', 'l', '8', '9'],
+    'o': ['i', 'p', 'k', 'l', '9', '0'], 'p': ['o', 'l', '0', '['],
+    'a': ['q', 'w', 's', 'z', 'x'], 's': ['q', 'w', 'e', 'a', 'd', 'z', 'x', 'c'],
+    'd': ['w', 'e', 'r', 's', 'f', 'x', 'c', 'v'], 'f': ['e', 'r', 't', 'd', 'g', 'c', 'v', 'b'],
+    'g': ['r', 't', 'y', 'f', 'h', 'v', 'b', 'n'], 'h': ['t', 'y', 'u', 'g', 'j', 'b', 'n', 'm'],
+    'j': ['y', 'u', 'i', 'h', 'k', 'n', 'm'], 'k': ['u', 'i', 'o', 'j', 'l', 'm', ','],
+    'l': ['i', 'o', 'p', 'k', '.', ';'],
+    'z': ['a', 's', 'x'], 'x': ['a', 's', 'd', 'z', 'c'], 'c': ['s', 'd', 'f', 'x', 'v'],
+    'v': ['d', 'f', 'g', 'c', 'b'], 'b': ['f', 'g', 'h', 'v', 'n'], 'n': ['g', 'h', 'j', 'b', 'm'],
+    'm': ['h', 'j', 'k', 'n', ','],
+    '1': ['2', 'q'], '2': ['1', '3', 'q', 'w'], '3': ['2', '4', 'w', 'e'], '4': ['3', '5', 'e', 'r'],
+    '5': ['4', '6', 'r', 't'], '6': ['5', '7', 't', 'y'], '7': ['6', '8', 'y', 'u'],
+    '8': ['7', '9', 'u', 'i'], '9': ['8', '0', 'i', 'o'], '0': ['9', 'p', '-'],
+    '-': ['0', '=', '[', 'p'], '=': ['-', '['], '[': ['p', ']', '=', '-'], ']': ['[', '\\'], '\\': [']'],
+    ',': ['k', 'l', 'm', '.'], '.': [',', 'l', '/', ';'], '/': ['.', ';'], ';': ['l', '.', '/', '\''], '\'': [';', '[', ']']
+}
+
+
+def get_adjacent_key(char, rng=random):
     """Returns a random adjacent key on a QWERTY keyboard."""
-    # QWERTY Layout (US standard)
-    keyboard_layout = {
-        'q': ['w', 'a', 's', '1', '2'], 'w': ['q', 'e', 'a', 's', 'd', '2', '3'],
-        'e': ['w', 'r', 's', 'd', 'f', '3', '4'], 'r': ['e', 't', 'd', 'f', 'g', '4', '5'],
-        't': ['r', 'y', 'f', 'g', 'h', '5', '6'], 'y': ['t', 'u', 'g', 'h', 'j', '6', '7'],
-        'u': ['y', 'i', 'h', 'j', 'k', '7', '8'], 'i': ['u', 'o', 'j', 'k', 'l', '8', '9'],
-        'o': ['i', 'p', 'k', 'l', '9', '0'], 'p': ['o', 'l', '0', '['],
-        'a': ['q', 'w', 's', 'z', 'x'], 's': ['q', 'w', 'e', 'a', 'd', 'z', 'x', 'c'],
-        'd': ['w', 'e', 'r', 's', 'f', 'x', 'c', 'v'], 'f': ['e', 'r', 't', 'd', 'g', 'c', 'v', 'b'],
-        'g': ['r', 't', 'y', 'f', 'h', 'v', 'b', 'n'], 'h': ['t', 'y', 'u', 'g', 'j', 'b', 'n', 'm'],
-        'j': ['y', 'u', 'i', 'h', 'k', 'n', 'm'], 'k': ['u', 'i', 'o', 'j', 'l', 'm', ','],
-        'l': ['i', 'o', 'p', 'k', '.', ';'],
-        'z': ['a', 's', 'x'], 'x': ['a', 's', 'd', 'z', 'c'], 'c': ['s', 'd', 'f', 'x', 'v'],
-        'v': ['d', 'f', 'g', 'c', 'b'], 'b': ['f', 'g', 'h', 'v', 'n'], 'n': ['g', 'h', 'j', 'b', 'm'],
-        'm': ['h', 'j', 'k', 'n', ','],
-        '1': ['2', 'q'], '2': ['1', '3', 'q', 'w'], '3': ['2', '4', 'w', 'e'], '4': ['3', '5', 'e', 'r'],
-        '5': ['4', '6', 'r', 't'], '6': ['5', '7', 't', 'y'], '7': ['6', '8', 'y', 'u'],
-        '8': ['7', '9', 'u', 'i'], '9': ['8', '0', 'i', 'o'], '0': ['9', 'p', '-'],
-        '-': ['0', '=', '[', 'p'], '=': ['-', '['], '[': ['p', ']', '=', '-'], ']': ['[', '\\'], '\\': [']'],
-        ',': ['k', 'l', 'm', '.'], '.': [',', 'l', '/', ';'], '/': ['.', ';'], ';': ['l', '.', '/', '\''], '\'': [';', '[', ']']
-    }
-    char_lower = char.lower()
-    if char_lower in keyboard_layout: return random.choice(keyboard_layout[char_lower])
+    neighbours = QWERTY_ADJACENT_KEYS.get(char.lower())
+    if neighbours: return rng.choice(neighbours)
     return None
 
-# --- Core Typing Simulation Functions ---
+# --- Document Analysis ---
+# One pass over the text: sentence tokenization, word splitting, sentence complexity and one
+# frequency lookup per unique token. Planning and the duration estimate both read the result.
 
-def type_word(word, keyboard, word_freq, typo_prob, capitalization_error_prob, typing_speed_factor):
-    """Types a word char by char with delays, simulating and IMMEDIATELY correcting typos/caps errors."""
-    original_word = word
+FACTOR_CACHE_LIMIT = 200_000 # Unique tokens kept while streaming before the factor cache is reset
+SentenceModel = collections.namedtuple("SentenceModel", "text words complexity")
+ParagraphModel = collections.namedtuple("ParagraphModel", "text sentences skipped", defaults=(False,)) # text is the raw line
+
+
+def word_frequency_factor(word_freq, word):
+    """Per-character delay multiplier for word (0.5-2.0): rarer words are typed more slowly."""
+    word_frequency = word_freq.get(word.lower(), 1)
+    return max(0.5, min(2.0, 1 / (word_frequency ** 0.1)))
+
+
+def analyze_sentence(sentence, word_freq, factors):
+    """Splits a sentence into words, scores it, and adds factors for tokens not yet in factors."""
+    words_to_type = sentence.split()
+    for word in words_to_type:
+        if word not in factors: factors[word] = word_frequency_factor(word_freq, word)
+    return SentenceModel(sentence, words_to_type, calculate_sentence_complexity(sentence, len(words_to_type)))
+
+
+def analyze_paragraph(paragraph, word_freq, factors):
+    """Tokenizes one paragraph line into SentenceModels (none for blank or untokenizable lines, the latter marked skipped)."""
+    stripped_paragraph = paragraph.strip()
+    if not stripped_paragraph: return ParagraphModel(paragraph, [])
+    import nltk
+    try: sentences = nltk.sent_tokenize(stripped_paragraph)
+    except Exception as e:
+        print(f"\nERROR tokenizing para: '{stripped_paragraph[:50]}...'. {e}. Skipping.")
+        return ParagraphModel(paragraph, [], True)
+    return ParagraphModel(paragraph, [analyze_sentence(s, word_freq, factors) for s in sentences])
+
+
+class DocumentModel:
+    """Analyzed document: ParagraphModels plus the frequency factor of every unique token."""
+    __slots__ = ("paragraphs", "factors")
+
+    def __init__(self, paragraphs, factors):
+        self.paragraphs = paragraphs; self.factors = factors
+
+    @property
+    def num_chars(self): return sum(len(p.text) for p in self.paragraphs) + max(0, len(self.paragraphs) - 1)
+    @property
+    def num_paragraphs(self): return sum(1 for p in self.paragraphs if p.text.strip())
+    @property
+    def num_sentences(self): return sum(len(p.sentences) for p in self.paragraphs)
+
+
+def iter_paragraphs(stream):
+    """
+    Lazily yields paragraph lines from a text stream, matching text.split("\n") on the whole content
+    (including the empty line after a trailing newline) without reading it all into memory.
+    """
+    ended_with_newline = True
+    for line in stream:
+        ended_with_newline = line.endswith("\n")
+        yield line[:-1] if ended_with_newline else line
+    if ended_with_newline: yield ""
+
+
+def analyze_document(text, word_freq):
+    """Builds the DocumentModel for text, tokenizing every paragraph exactly once."""
+    factors = {}
+    return DocumentModel([analyze_paragraph(p, word_freq, factors) for p in text.split("\n")], factors)
+
+
+# --- Keystroke Plan (Event IR) ---
+# Planning turns text into (action, key, delay) records; dispatch replays them. All random
+# decisions happen while planning, so a plan is reproducible from its seed and can be
+# generated and inspected far faster than real time.
+
+EV_KEY = 0   # Press and release key, then wait delay
+EV_PRESS = 1 # Press key without releasing it, then wait delay
+EV_WAIT = 2  # Wait delay without touching the keyboard
+EV_BREAK = 3 # Session break: key is BREAK_SHORT/BREAK_LONG, wait delay
+
+KEY_SPACE = -1; KEY_BACKSPACE = -2; KEY_ENTER = -3 # Special keys; other keys are ord(char)
+BREAK_SHORT = 0; BREAK_LONG = 1
+_KEY_LABELS = {KEY_SPACE: "space", KEY_BACKSPACE: "backspace", KEY_ENTER: "enter"}
+
+
+class KeystrokePlan:
+    """Compact, array-backed sequence of (action, key, delay) keystroke events."""
+    __slots__ = ("actions", "keys", "delays")
+
+    def __init__(self):
+        self.actions = array.array("b"); self.keys = array.array("l"); self.delays = array.array("d")
+
+    def add(self, action, key, delay=0.0):
+        self.actions.append(action); self.keys.append(key); self.delays.append(delay)
+
+    def key(self, char_or_key, delay=0.0):
+        """Adds a key tap; char_or_key is a single character or a KEY_* code."""
+        self.add(EV_KEY, ord(char_or_key) if isinstance(char_or_key, str) else char_or_key, delay)
+
+    def extend(self, other):
+        self.actions.extend(other.actions); self.keys.extend(other.keys); self.delays.extend(other.delays)
+
+    def total_delay(self): return math.fsum(self.delays)
+    def __len__(self): return len(self.actions)
+    def __iter__(self): return zip(self.actions, self.keys, self.delays)
+
+
+def key_label(key):
+    """Human-readable name for a plan key code."""
+    return _KEY_LABELS.get(key) or chr(key)
+
+
+def plan_word(plan, word, word_freq, typo_prob, capitalization_error_prob, typing_speed_factor, rng=random,
+              frequency_factor=None):
+    """
+    Plans a word char by char with delays, simulating and IMMEDIATELY correcting typos/caps errors.
+    Pass frequency_factor (e.g. from a DocumentModel) to skip the word_freq lookup.
+    """
     if not word: return
+    if frequency_factor is None: frequency_factor = word_frequency_factor(word_freq, word)
+    base_delay = 0.15; max_char_delay = base_delay * frequency_factor
 
     first_char_intended = word[0]; corrected_first_char_after_error = False
 
     # Capitalization Error Simulation
-    if random.random() < capitalization_error_prob:
+    if rng.random() < capitalization_error_prob:
         incorrect = None
         if 'A' <= first_char_intended <= 'Z': incorrect = first_char_intended.lower()
         if incorrect and incorrect != first_char_intended:
-            try:
-                keyboard.press(incorrect); keyboard.release(incorrect); time.sleep(random.uniform(0.04, 0.12) * typing_speed_factor)
-                keyboard.press(pynput.keyboard.Key.backspace); keyboard.release(pynput.keyboard.Key.backspace); time.sleep(random.uniform(0.05, 0.15) * typing_speed_factor)
-                corrected_first_char_after_error = True
-            except Exception as e: print(f"\nERROR simulating caps error: {e}")
+            plan.key(incorrect, rng.uniform(0.04, 0.12) * typing_speed_factor)
+            plan.key(KEY_BACKSPACE, rng.uniform(0.05, 0.15) * typing_speed_factor)
+            corrected_first_char_after_error = True
 
-    # Character Typing Loop
+    # Character Planning Loop
     for i, target_char in enumerate(word):
-        action_taken = False; typo_corrected = False
-        if i == 0 and corrected_first_char_after_error:
-            try: keyboard.press(target_char); keyboard.release(target_char); action_taken = True
-            except Exception as e: print(f"\nERROR typing corrected first char '{target_char}': {e}")
-        else:
-            make_typo = random.random() < typo_prob
-            if make_typo:
-                typo_type = random.random()
-                try:
-                    if typo_type < 0.6: # Wrong Key
-                        typo_char = get_adjacent_key(target_char)
-                        if typo_char:
-                            keyboard.press(typo_char); keyboard.release(typo_char); time.sleep(random.uniform(0.03, 0.1)*typing_speed_factor)
-                            keyboard.press(pynput.keyboard.Key.backspace); keyboard.release(pynput.keyboard.Key.backspace); time.sleep(random.uniform(0.05, 0.15)*typing_speed_factor)
-                            keyboard.press(target_char); keyboard.release(target_char); typo_corrected = True; action_taken = True
-                    elif typo_type < 0.8: # Omitted Key
-                         time.sleep(random.uniform(0.06, 0.25)*typing_speed_factor)
-                         keyboard.press(target_char); keyboard.release(target_char); typo_corrected = True; action_taken = True
-                    else: # Repeated Key
-                         keyboard.press(target_char); keyboard.release(target_char); time.sleep(random.uniform(0.01, 0.05)*typing_speed_factor)
-                         keyboard.press(target_char); keyboard.release(target_char); time.sleep(random.uniform(0.05, 0.15)*typing_speed_factor)
-                         keyboard.press(pynput.keyboard.Key.backspace); keyboard.release(pynput.keyboard.Key.backspace); typo_corrected = True; action_taken = True
-                except Exception as e:
-                    print(f"\nERROR during typo sim for '{target_char}': {e}")
-                    if not action_taken:
-                        try: keyboard.press(target_char); keyboard.release(target_char); action_taken = True
-                        except: pass # Best effort fallback
-            if not action_taken: # Type Correctly if no typo happened/failed
-                 try: keyboard.press(target_char); keyboard.release(target_char); action_taken = True
-                 except Exception as e: print(f"\nERROR typing char '{target_char}': {e}")
+        typo_corrected = False; final_key = target_char
+        if not (i == 0 and corrected_first_char_after_error) and rng.random() < typo_prob:
+            typo_type = rng.random()
+            if typo_type < 0.6: # Wrong Key
+                typo_char = get_adjacent_key(target_char, rng)
+                if typo_char:
+                    plan.key(typo_char, rng.uniform(0.03, 0.1)*typing_speed_factor)
+                    plan.key(KEY_BACKSPACE, rng.uniform(0.05, 0.15)*typing_speed_factor); typo_corrected = True
+            elif typo_type < 0.8: # Omitted Key
+                plan.add(EV_WAIT, 0, rng.uniform(0.06, 0.25)*typing_speed_factor); typo_corrected = True
+            else: # Repeated Key (the trailing backspace removes the duplicate)
+                plan.key(target_char, rng.uniform(0.01, 0.05)*typing_speed_factor)
+                plan.key(target_char, rng.uniform(0.05, 0.15)*typing_speed_factor)
+                final_key = KEY_BACKSPACE; typo_corrected = True
 
         # Character Timing
-        word_frequency = word_freq.get(original_word.lower(), 1)
-        base_delay = 0.15; frequency_factor = max(0.5, min(2.0, 1 / (word_frequency ** 0.1)))
         correction_delay = 1.5 if typo_corrected or corrected_first_char_after_error else 1.0
-        char_delay = random.uniform(0.02, base_delay * frequency_factor) * typing_speed_factor * correction_delay
-        time.sleep(max(0.005, char_delay))
+        char_delay = rng.uniform(0.02, max_char_delay) * typing_speed_factor * correction_delay
+        plan.key(final_key, max(0.005, char_delay))
 
 
-def type_sentence(sentence, keyboard, word_freq, burst_prob, burst_length_min, burst_length_max,
-                  typo_prob, capitalization_error_prob, typing_speed_factor):
-    """Types a sentence using word typer, handling bursts and spacing between words."""
-    words_to_type = sentence.split();
+def _plan_sentence_model(plan, sentence, factors, burst_prob, burst_length_min, burst_length_max,
+                         typo_prob, capitalization_error_prob, typing_speed_factor, rng):
+    """Plans an analyzed SentenceModel; factors maps each of its tokens to a frequency factor."""
+    words_to_type = sentence.words
     if not words_to_type: return
-    sentence_complexity = calculate_sentence_complexity(sentence)
+    sentence_complexity = sentence.complexity
     i = 0
     while i < len(words_to_type):
         if i > 0: # Inter-Word Space (before word 1, 2, ...)
-            try: keyboard.press(pynput.keyboard.Key.space); keyboard.release(pynput.keyboard.Key.space)
-            except Exception as e: print(f"\nERROR typing space: {e}")
-            pause = random.uniform(0.2, 0.7) * (1 + sentence_complexity / 80.0) * typing_speed_factor
-            time.sleep(max(0.01, pause))
+            pause = rng.uniform(0.2, 0.7) * (1 + sentence_complexity / 80.0) * typing_speed_factor
+            plan.key(KEY_SPACE, max(0.01, pause))
         current_word_index = i; is_burst = False
-        if random.random() < burst_prob and (len(words_to_type) - i) >= burst_length_min: # Burst?
-            burst_len = random.randint(burst_length_min, burst_length_max); burst_end = min(i + burst_len, len(words_to_type))
-            if burst_end > i + 1: is_burst = True
+        if rng.random() < burst_prob and (len(words_to_type) - i) >= burst_length_min: # Burst?
+            burst_len = rng.randint(burst_length_min, burst_length_max); burst_end = min(i + burst_len, len(words_to_type))
+            if burst_end > i: is_burst = True # Even a one-word burst has typed its word
             for j in range(i, burst_end):
-                if j > i: # Space within burst
-                     try: keyboard.press(pynput.keyboard.Key.space); keyboard.release(pynput.keyboard.Key.space)
-                     except Exception as e: print(f"\nERROR typing burst space: {e}")
-                     time.sleep(random.uniform(0.015, 0.06) * typing_speed_factor)
-                type_word(words_to_type[j], keyboard, word_freq, typo_prob, capitalization_error_prob, typing_speed_factor)
+                if j > i: plan.key(KEY_SPACE, rng.uniform(0.015, 0.06) * typing_speed_factor) # Space within burst
+                plan_word(plan, words_to_type[j], None, typo_prob, capitalization_error_prob, typing_speed_factor, rng,
+                          factors[words_to_type[j]])
             i = burst_end
         if not is_burst: # Single Word
              if current_word_index < len(words_to_type):
-                 type_word(words_to_type[current_word_index], keyboard, word_freq, typo_prob, capitalization_error_prob, typing_speed_factor)
+                 word = words_to_type[current_word_index]
+                 plan_word(plan, word, None, typo_prob, capitalization_error_prob, typing_speed_factor, rng, factors[word])
                  i += 1
              else: break
 
 
-def falsify_google_docs_history(text, word_freq, min_interval=1, max_interval=5, min_break=60, max_break=180,
-                                min_sentences_per_session=3, max_sentences_per_session=7, long_break_prob=0.1,
-                                long_break_min=900, long_break_max=2700, burst_prob=0.5, burst_length_min=2,
-                                burst_length_max=5, typo_prob=0.015, capitalization_error_prob=0.025,
-                                typing_speed_factor=1.0):
-    """Main simulation loop: paragraphs, sentences, sessions, breaks, estimates."""
-    try:
-        keyboard = pynput.keyboard.Controller()
-    except Exception as e: print(f"\nFATAL ERROR: Keyboard controller init failed: {e}"); sys.exit(1)
+def plan_sentence(plan, sentence, word_freq, burst_prob, burst_length_min, burst_length_max,
+                  typo_prob, capitalization_error_prob, typing_speed_factor, rng=random):
+    """Plans a sentence using the word planner, handling bursts and spacing between words."""
+    factors = {}
+    _plan_sentence_model(plan, analyze_sentence(sentence, word_freq, factors), factors, burst_prob, burst_length_min,
+                         burst_length_max, typo_prob, capitalization_error_prob, typing_speed_factor, rng)
 
-    paragraphs = text.split("\n")
 
-    # --- Calculate Estimate ---
-    estimated_duration_str = "Unknown"
-    formatted_completion_time = "Unknown"
-    try:
-        total_chars = len(text)
-        stripped_paragraphs = [p for p in paragraphs if p.strip()]
-        num_paragraphs = len(stripped_paragraphs)
-        total_sentences = sum(len(nltk.sent_tokenize(p)) for p in stripped_paragraphs) if stripped_paragraphs else 0
-
-        if total_chars > 0 and total_sentences > 0:
-            base_wpm = 50; chars_per_word = 5.5 # Estimation constants
-            estimated_typing_time_only = max(0, total_chars * (60 / (base_wpm * chars_per_word)) / typing_speed_factor)
-            avg_sentences_per_session = (min_sentences_per_session + max_sentences_per_session) / 2
-            num_sessions = total_sentences / avg_sentences_per_session if avg_sentences_per_session > 0 else 0
-            num_breaks = max(0, num_sessions - num_paragraphs)
-            num_long_breaks = num_breaks * long_break_prob
-            num_short_breaks = num_breaks * (1 - long_break_prob)
-            estimated_long_break_time = max(0, num_long_breaks * ((long_break_min + long_break_max) / 2) * typing_speed_factor)
-            estimated_short_break_time = max(0, num_short_breaks * ((min_break + max_break) / 2) * typing_speed_factor)
-            estimated_inter_sentence_time = max(0, total_sentences - num_paragraphs) * ((min_interval + max_interval) / 2) * typing_speed_factor
-            total_estimated_duration = (estimated_typing_time_only + estimated_long_break_time +
-                                        estimated_short_break_time + estimated_inter_sentence_time)
-            estimated_duration_str = format_duration(total_estimated_duration)
-            start_timestamp = time.time()
-            estimated_completion_timestamp = start_timestamp + total_estimated_duration
-            completion_dt = datetime.datetime.fromtimestamp(estimated_completion_timestamp)
-            formatted_completion_time = completion_dt.strftime("%Y-%m-%d %H:%M:%S")
-        elif total_chars > 0:
-            print("Warning: Text found but could not tokenize into sentences for full estimate.")
-            base_wpm = 50; chars_per_word = 5.5
-            total_estimated_duration = max(0, total_chars * (60 / (base_wpm * chars_per_word)) / typing_speed_factor)
-            estimated_duration_str = format_duration(total_estimated_duration) + " (typing only)"
-            start_timestamp = time.time()
-            estimated_completion_timestamp = start_timestamp + total_estimated_duration
-            completion_dt = datetime.datetime.fromtimestamp(estimated_completion_timestamp)
-            formatted_completion_time = completion_dt.strftime("%Y-%m-%d %H:%M:%S") + " (typing only)"
-        else:
-             estimated_duration_str = "0s"
-             formatted_completion_time = "N/A (No text)"
-    except Exception as est_err:
-        print(f"\nWarning: Could not calculate time estimate: {est_err}")
-    # --- End Estimate ---
+def _sample_sentences(sentences, factors, burst_length_min, burst_length_max, typo_prob,
+                      capitalization_error_prob, typing_speed_factor, np_rng):
+    """
+    Draws every random number needed to plan SentenceModels (e.g. one paragraph) in a few NumPy batches,
+    and lays out the keystrokes of typo-free words (chars plus the space before each) as whole arrays.
+    """
+    import numpy as np
+    words_to_type = [w for s in sentences for w in s.words]
+    num_words = len(words_to_type); tsf = typing_speed_factor
+    lengths = np.fromiter((len(w) for w in words_to_type), np.int64, num_words)
+    starts = np.zeros(num_words, np.int64); np.cumsum(lengths[:-1], out=starts[1:]); num_chars = int(lengths.sum())
 
-    print(f"\nCurrent Time: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    print(f"Estimated Total Duration: ~{estimated_duration_str}")
-    print(f"Estimated Completion Time: ~{formatted_completion_time}")
-    print("\nYou have 5 seconds to switch to the target window...")
-    time.sleep(5)
-    actual_start_time = time.time()
-    print("Starting typing simulation...")
+    # Per word: caps roll, caps delays x2, burst roll, space-before-word delay; plus burst lengths
+    word_u = np_rng.random((num_words, 5)); burst_lens = np_rng.integers(burst_length_min, burst_length_max + 1, num_words)
+    # Per char: typo roll, typo type, adjacent-key pick, typo delays x2, char delay
+    char_u = np_rng.random((num_chars, 6))
 
-    # --- Main Typing Loop ---
-    for para_index, paragraph in enumerate(paragraphs):
-        stripped_paragraph = paragraph.strip()
-        if not stripped_paragraph: # Handle blank lines
-             if para_index < len(paragraphs) - 1:
-                next_para_is_empty = (para_index + 1 < len(paragraphs) and not paragraphs[para_index+1].strip())
-                if not next_para_is_empty:
-                    try: keyboard.press(pynput.keyboard.Key.enter); keyboard.release(pynput.keyboard.Key.enter); time.sleep(random.uniform(0.4, 1.2)*typing_speed_factor)
-                    except Exception as e: print(f"\nERROR typing Enter for blank line: {e}")
-             continue
-
-        try: sentences = nltk.sent_tokenize(stripped_paragraph)
-        except Exception as e: print(f"\nERROR tokenizing para: '{stripped_paragraph[:50]}...'. {e}. Skipping."); continue
-        if not sentences: continue
+    frequency_factors = np.fromiter(map(factors.__getitem__, words_to_type), np.float64, num_words)
+    char_delay = (0.02 + char_u[:, 5] * (0.15 * np.repeat(frequency_factors, lengths) - 0.02)) * tsf
+    plain_delays = np.maximum(0.005, char_delay)
+    typo_mask = char_u[:, 0] < typo_prob; typo_chars = np.flatnonzero(typo_mask)
+    typo_rows = dict(zip(typo_chars.tolist(), char_u[typo_chars].tolist())) # Only typo chars need their draws
+    word_has_typo = np.add.reduceat(typo_mask, starts) > 0 if num_words else np.zeros(0, bool)
+    caps_error = [u < capitalization_error_prob and 'A' <= w[0] <= 'Z' for u, w in zip(word_u[:, 0].tolist(), words_to_type)]
+    slow_words = np.flatnonzero(word_has_typo | np.array(caps_error, bool)).tolist() # Planned char by char
+
+    # Fast-path layout: word j is [space,] chars; the first word of a sentence has no space before it
+    word_offsets = [0]
+    for s in sentences: word_offsets.append(word_offsets[-1] + len(s.words))
+    has_space = np.ones(num_words, np.int64); has_space[[o for o in word_offsets[:-1] if o < num_words]] = 0
+    complexity = np.repeat([s.complexity for s in sentences], [len(s.words) for s in sentences])
+    event_starts = np.zeros(num_words + 1, np.int64); np.cumsum(lengths + has_space, out=event_starts[1:])
+    keys = np.empty(int(event_starts[-1]), np.dtype(f"i{array.array('l').itemsize}")); delays = np.empty(len(keys))
+    space_events = event_starts[:-1][has_space == 1]
+    keys[space_events] = KEY_SPACE
+    delays[space_events] = np.maximum(0.01, (0.2 + word_u[:, 4] * 0.5) * (1 + complexity / 80.0) * tsf)[has_space == 1]
+    char_events = np.arange(num_chars) + np.repeat(event_starts[:-1] + has_space - starts, lengths)
+    keys[char_events] = np.frombuffer("".join(words_to_type).encode("utf-32-le", "surrogatepass"), "<u4")
+    delays[char_events] = plain_delays
+
+    return types.SimpleNamespace(
+        sentences=sentences, words=words_to_type, word_offsets=word_offsets, starts=starts.tolist(),
+        word_u=word_u, burst_rolls=word_u[:, 3].tolist(), burst_lens=burst_lens.tolist(), caps_error=caps_error,
+        slow_words=slow_words, typo_rows=typo_rows, plain_delays=plain_delays, corrected_delays=np.maximum(0.005, char_delay * 1.5),
+        burst_spaces=(0.015 + word_u[:, 4] * 0.045) * tsf, event_starts=event_starts.tolist(), keys=keys, delays=delays)
+
+
+def _emit_sampled_sentence(plan, sample, index, burst_prob, burst_length_min, typing_speed_factor):
+    """Plans sentence `index` of a _sample_sentences() batch; same model as plan_sentence."""
+    first_word = sample.word_offsets[index]; end_word = sample.word_offsets[index + 1]; num_words = end_word - first_word
+    if not num_words: return
+    words_to_type = sample.words; word_u = sample.word_u; tsf = typing_speed_factor; event_starts = sample.event_starts
+
+    # Bursts: words after the first of a burst get the short in-burst space instead of the inter-word one
+    burst_rolls = sample.burst_rolls; i = 0
+    while i < num_words:
+        if burst_rolls[first_word + i] < burst_prob and (num_words - i) >= burst_length_min: # Burst?
+            burst_end = min(i + sample.burst_lens[first_word + i], num_words)
+            if burst_end > i + 1:
+                for j in range(first_word + i + 1, first_word + burst_end): sample.delays[event_starts[j]] = sample.burst_spaces[j]
+            i = max(burst_end, i + 1)
+        else: i += 1
+
+    def emit_run(start_word, stop_word): # Typo-free words, straight from the layout arrays
+        begin = event_starts[start_word]; end = event_starts[stop_word]
+        if end > begin:
+            plan.actions.frombytes(bytes(end - begin)) # EV_KEY == 0
+            plan.keys.frombytes(sample.keys[begin:end].tobytes()); plan.delays.frombytes(sample.delays[begin:end].tobytes())
+
+    def emit_word(j):
+        word = words_to_type[j]; start = sample.starts[j]; caps = sample.caps_error[j]
+        if caps:
+            plan.key(word[0].lower(), (0.04 + float(word_u[j, 1]) * 0.08) * tsf)
+            plan.key(KEY_BACKSPACE, (0.05 + float(word_u[j, 2]) * 0.1) * tsf)
+        for i, target_char in enumerate(word):
+            k = start + i; typo_corrected = False; final_key = target_char
+            u = None if i == 0 and caps else sample.typo_rows.get(k)
+            if u is not None:
+                if u[1] < 0.6: # Wrong Key
+                    neighbours = QWERTY_ADJACENT_KEYS.get(target_char.lower())
+                    if neighbours:
+                        plan.key(neighbours[int(u[2] * len(neighbours))], (0.03 + u[3] * 0.07) * tsf)
+                        plan.key(KEY_BACKSPACE, (0.05 + u[4] * 0.1) * tsf); typo_corrected = True
+                elif u[1] < 0.8: # Omitted Key
+                    plan.add(EV_WAIT, 0, (0.06 + u[3] * 0.19) * tsf); typo_corrected = True
+                else: # Repeated Key
+                    plan.key(target_char, (0.01 + u[3] * 0.04) * tsf)
+                    plan.key(target_char, (0.05 + u[4] * 0.1) * tsf)
+                    final_key = KEY_BACKSPACE; typo_corrected = True
+            delays = sample.corrected_delays if typo_corrected or caps else sample.plain_delays
+            plan.key(final_key, float(delays[k]))
+
+    run_start = first_word
+    for j in sample.slow_words[bisect.bisect_left(sample.slow_words, first_word):]:
+        if j >= end_word: break
+        emit_run(run_start, j)
+        if j > first_word: plan.key(KEY_SPACE, float(sample.delays[event_starts[j]]))
+        emit_word(j); run_start = j + 1
+    emit_run(run_start, end_word)
+
+
+def plan_sentence_vectorized(plan, sentence, word_freq, burst_prob, burst_length_min, burst_length_max,
+                             typo_prob, capitalization_error_prob, typing_speed_factor, np_rng):
+    """
+    Same model as plan_sentence, but every random number is drawn up front in NumPy batches
+    from np_rng, and typo-free words are appended to the plan as whole arrays.
+    """
+    factors = {}
+    sample = _sample_sentences([analyze_sentence(sentence, word_freq, factors)], factors, burst_length_min,
+                               burst_length_max, typo_prob, capitalization_error_prob, typing_speed_factor, np_rng)
+    _emit_sampled_sentence(plan, sample, 0, burst_prob, burst_length_min, typing_speed_factor)
+
+
+def iter_paragraph_plans(paragraphs, word_freq, min_interval=1, max_interval=5, min_break=60, max_break=180,
+                         min_sentences_per_session=3, max_sentences_per_session=7, long_break_prob=0.1,
+                         long_break_min=900, long_break_max=2700, burst_prob=0.5, burst_length_min=2,
+                         burst_length_max=5, typo_prob=0.015, capitalization_error_prob=0.025,
+                         typing_speed_factor=1.0, seed=None, vectorized=False, factors=None, state=None):
+    """
+    Plans paragraphs one at a time: sentences, sessions and breaks. Yields (ParagraphModel, KeystrokePlan)
+    per paragraph line. paragraphs may be ParagraphModels (with their factors) or raw lines, which are
+    analyzed lazily, so only one paragraph is held at a time. Same seed, same plans.
+    vectorized=True samples each paragraph in NumPy batches (see plan_sentence_vectorized); it follows
+    the same distributions but a different random stream, so plans differ from the scalar path.
+    state, if given, is a dict updated before each paragraph is planned with its index ("paragraph"),
+    the characters before it ("chars") and the RNG states ("random", "numpy"). Passing a saved state
+    back resumes: earlier paragraphs are skipped unanalyzed and the RNGs restored, so the plans that
+    follow match the original run.
+    """
+    rng = random.Random(seed)
+    if vectorized:
+        try: import numpy
+        except ImportError: print("Warning: NumPy not installed, using scalar sampling."); vectorized = False
+        else: np_rng = numpy.random.default_rng(seed)
+    if factors is None: factors = {}
+    resume_at = 0; chars = 0
+    if state and "random" in state: # Resume from a saved state
+        resume_at = state["paragraph"]; rng.setstate(state["random"])
+        if vectorized and state.get("numpy"): np_rng.bit_generator.state = state["numpy"]
+
+    lines = iter(paragraphs); following = next(lines, None); index = -1
+    while following is not None:
+        paragraph, following = following, next(lines, None) # One-paragraph lookahead for Enter handling
+        index += 1; text_len = len(paragraph if isinstance(paragraph, str) else paragraph.text)
+        if index < resume_at: chars += text_len + 1; continue # Planned and typed before the resume
+        if state is not None:
+            state.update(paragraph=index, chars=chars, random=rng.getstate(),
+                         numpy=np_rng.bit_generator.state if vectorized else None)
+        chars += text_len + 1
+        if isinstance(paragraph, str):
+            if len(factors) > FACTOR_CACHE_LIMIT: factors.clear() # Keep streaming memory bounded
+            paragraph = analyze_paragraph(paragraph, word_freq, factors)
+        plan = KeystrokePlan(); is_last = following is None
+        if not paragraph.text.strip(): # Handle blank lines
+            next_para_is_empty = not is_last and not (following if isinstance(following, str) else following.text).strip()
+            if not is_last and not next_para_is_empty: plan.key(KEY_ENTER, rng.uniform(0.4, 1.2)*typing_speed_factor)
+            yield paragraph, plan; continue
+
+        sentences = paragraph.sentences
+        if not sentences: yield paragraph, plan; continue # Tokenization failed or found nothing
+        if vectorized: # One batch of random draws for the whole paragraph
+            sample = _sample_sentences(sentences, factors, burst_length_min, burst_length_max, typo_prob,
+                                       capitalization_error_prob, typing_speed_factor, np_rng)
 
         num_sentences_in_para = len(sentences); sentences_typed_in_para = 0
         while sentences_typed_in_para < num_sentences_in_para: # Session loop
-            num_sentences_this = random.randint(min_sentences_per_session, max_sentences_per_session)
+            num_sentences_this = rng.randint(min_sentences_per_session, max_sentences_per_session)
             session_end = min(sentences_typed_in_para + num_sentences_this, num_sentences_in_para)
             for k in range(sentences_typed_in_para, session_end):
-                # Type the current sentence
-                type_sentence(sentences[k], keyboard, word_freq, burst_prob, burst_length_min, burst_length_max,
-                              typo_prob, capitalization_error_prob, typing_speed_factor)
+                if vectorized: _emit_sampled_sentence(plan, sample, k, burst_prob, burst_length_min, typing_speed_factor)
+                else:
+                    _plan_sentence_model(plan, sentences[k], factors, burst_prob, burst_length_min, burst_length_max,
+                                         typo_prob, capitalization_error_prob, typing_speed_factor, rng)
                 sentences_typed_in_para += 1
 
-                # === INTER-SENTENCE SPACING FIX ===
-                # Add space(s) and pause if not the very last sentence in the paragraph
+                # Inter-sentence space and the longer pause after it
                 if sentences_typed_in_para < num_sentences_in_para:
-                    try:
-                        # Add TWO spaces after sentence-ending punctuation (common convention)
-                        keyboard.press(pynput.keyboard.Key.space); 
-
-                    except Exception as e:
-                        print(f"\nERROR typing inter-sentence space: {e}")
-
-                    # Now, apply the longer pause *after* the spaces
-                    interval = random.uniform(min_interval, max_interval) * typing_speed_factor
-                    time.sleep(max(0.01, interval))
-                # === END FIX ===
+                    interval = rng.uniform(min_interval, max_interval) * typing_speed_factor
+                    plan.key(KEY_SPACE, max(0.01, interval))
 
             # --- Break logic ---
             if session_end < num_sentences_in_para: # Break between sessions
-                duration = 0; break_type = "short"
-                if random.random() < long_break_prob:
-                    duration = random.uniform(long_break_min, long_break_max) * typing_speed_factor; break_type = "long"
-                else: duration = random.uniform(min_break, max_break) * typing_speed_factor
-                print(f"\nTaking a {break_type} break for {format_duration(duration)}...")
-                time.sleep(max(0.1, duration)); print("Resuming typing...")
-            # --- End Break Logic ---
+                if rng.random() < long_break_prob:
+                    plan.add(EV_BREAK, BREAK_LONG, max(0.1, rng.uniform(long_break_min, long_break_max) * typing_speed_factor))
+                else: plan.add(EV_BREAK, BREAK_SHORT, max(0.1, rng.uniform(min_break, max_break) * typing_speed_factor))
 
         # --- End of Paragraph Enter ---
-        if para_index < len(paragraphs) - 1:
-            try: keyboard.press(pynput.keyboard.Key.enter); keyboard.release(pynput.keyboard.Key.enter); time.sleep(random.uniform(0.5, 1.5)*typing_speed_factor)
-            except Exception as e: print(f"\nERROR typing paragraph Enter: {e}")
-        # --- End EOP ---
-    # --- End Main Loop ---
-
-    actual_end_time = time.time()
-    actual_total_duration = actual_end_time - actual_start_time
+        if not is_last: plan.key(KEY_ENTER, rng.uniform(0.5, 1.5)*typing_speed_factor)
+        yield paragraph, plan
+
+
+def plan_document(text, word_freq, min_interval=1, max_interval=5, min_break=60, max_break=180,
+                  min_sentences_per_session=3, max_sentences_per_session=7, long_break_prob=0.1,
+                  long_break_min=900, long_break_max=2700, burst_prob=0.5, burst_length_min=2,
+                  burst_length_max=5, typo_prob=0.015, capitalization_error_prob=0.025,
+                  typing_speed_factor=1.0, seed=None, vectorized=False):
+    """
+    Plans the whole document into one KeystrokePlan (see iter_paragraph_plans). text may be a string
+    or a DocumentModel from analyze_document (word_freq is then unused).
+    """
+    model = text if isinstance(text, DocumentModel) else analyze_document(text, word_freq)
+    plan = KeystrokePlan()
+    for _, paragraph_plan in iter_paragraph_plans(
+            model.paragraphs, word_freq, min_interval, max_interval, min_break, max_break,
+            min_sentences_per_session, max_sentences_per_session, long_break_prob, long_break_min,
+            long_break_max, burst_prob, burst_length_min, burst_length_max, typo_prob,
+            capitalization_error_prob, typing_speed_factor, seed, vectorized, model.factors):
+        plan.extend(paragraph_plan)
+    return plan
+
+
+# --- Replay Verification ---
+# Replays plans into an in-memory editor (a gap buffer with a cursor) and checks the result against
+# the source text, so a plan that would not reproduce its text is caught before it is dispatched.
+
+class PlanVerificationError(ValueError):
+    """A plan does not type its source text; offset is the first divergent character of the output."""
+    def __init__(self, message, offset):
+        super().__init__(message); self.offset = offset
+
+
+class ReplayDocument:
+    """
+    Gap-buffer editor model: key events edit the text at the cursor. Records every key pressed without
+    a release (EV_PRESS), which a real keyboard would hold down, and auto-repeat, through later events.
+    """
+
+    _CODEC = "utf-32-le" if sys.byteorder == "little" else "utf-32-be" # Decodes the code point buffer
+
+    def __init__(self, capacity=256):
+        self._buf = array.array("I", [0]) * capacity
+        self._start = 0; self._end = capacity # The gap is _buf[_start:_end]; the cursor sits at _start
+        self.unreleased = [] # (event index, key, cursor) of each EV_PRESS
+        self.underflow = 0 # Backspaces with nothing before the cursor
+
+    def __len__(self): return len(self._buf) - (self._end - self._start)
+
+    def _grow(self, needed):
+        buf = self._buf; size = len(buf); tail = size - self._end
+        new_size = max(2 * size, size + needed)
+        new_end = new_size - tail
+        grown = buf[:self._start]; grown.extend(array.array("I", [0]) * (new_end - self._start))
+        grown.extend(buf[self._end:]); self._buf = grown; self._end = new_end
+
+    def replay(self, plan, start=0, end=None):
+        """Applies plan events start..end: key presses type (Enter as "\\n", Backspace deletes), waits and breaks don't."""
+        actions = plan.actions; keys = plan.keys
+        buf = self._buf; gap_start = self._start; gap_end = self._end
+        for index in range(start, len(actions) if end is None else end):
+            action = actions[index]
+            if action > EV_PRESS: continue # EV_WAIT, EV_BREAK
+            key = keys[index]
+            if action == EV_PRESS: self.unreleased.append((index, key, gap_start))
+            if key == KEY_BACKSPACE:
+                if gap_start: gap_start -= 1
+                else: self.underflow += 1
+                continue
+            if gap_start == gap_end:
+                self._start = gap_start; self._grow(1); buf = self._buf; gap_end = self._end
+            buf[gap_start] = 32 if key == KEY_SPACE else 10 if key == KEY_ENTER else key; gap_start += 1
+        self._start = gap_start
+        return self
+
+    def text(self):
+        buf = self._buf
+        return (buf[:self._start].tobytes() + buf[self._end:].tobytes()).decode(self._CODEC)
+
+
+def first_divergence(actual, expected):
+    """Index of the first character where two strings differ (the shorter length if one is a prefix), or None."""
+    if actual == expected: return None
+    low = 0; high = min(len(actual), len(expected))
+    while low < high: # Binary search on prefix equality (slice compares run in C)
+        middle = (low + high + 1) // 2
+        if actual[:middle] == expected[:middle]: low = middle
+        else: high = middle - 1
+    return low
+
+
+def typed_paragraph_text(paragraph):
+    """
+    What the planner types for one paragraph (a line or a ParagraphModel), before its Enter: the words,
+    single-spaced, or nothing for a paragraph that was skipped because it failed to tokenize.
+    """
+    if isinstance(paragraph, str): return " ".join(paragraph.split())
+    return "" if paragraph.skipped else " ".join(paragraph.text.split())
+
+
+def _is_blank(paragraph): return not (paragraph if isinstance(paragraph, str) else paragraph.text).split()
+
+
+def expected_typed_text(text):
+    """
+    What a plan of text (a string or a DocumentModel) should leave in the document: paragraphs
+    single-spaced, an Enter after each paragraph but the last, and runs of blank lines collapsed to one
+    blank line. Skipped paragraphs (DocumentModel only) type nothing, not even their Enter.
+    """
+    paragraphs = text.paragraphs if isinstance(text, DocumentModel) else text.split("\n"); out = []
+    for index, paragraph in enumerate(paragraphs):
+        out.append(typed_paragraph_text(paragraph))
+        if index == len(paragraphs) - 1 or not isinstance(paragraph, str) and paragraph.skipped: continue
+        if not _is_blank(paragraph) or not _is_blank(paragraphs[index + 1]): out.append("\n")
+    return "".join(out)
+
+
+def _divergence_error(offset, actual, expected, base=0):
+    return PlanVerificationError(f"Plan diverges from the text at character {base + offset}: typed "
+                                 f"{actual[offset:offset + 20]!r}, expected {expected[offset:offset + 20]!r}", base + offset)
+
+
+def _check_released(document, base=0):
+    if document.unreleased:
+        index, key, cursor = document.unreleased[0]
+        raise PlanVerificationError(f"{key_label(key)!r} is pressed but never released at character {base + cursor} "
+                                    f"({len(document.unreleased)} such presses); a held key auto-repeats", base + cursor)
+
+
+def verify_plan(plan, text):
+    """
+    Replays a whole-document plan (e.g. from plan_document) against text, a string or the DocumentModel
+    it was planned from; raises PlanVerificationError.
+    """
+    document = ReplayDocument().replay(plan); actual = document.text(); expected = expected_typed_text(text)
+    offset = first_divergence(actual, expected)
+    if offset is not None: raise _divergence_error(offset, actual, expected)
+    _check_released(document)
+
+
+class PlanVerifier:
+    """
+    Checks paragraph plans one at a time, in document order, before they are dispatched. Whether a
+    paragraph should end with Enter depends on the next one, so that part is checked a paragraph late
+    (and by finish() for the last), after the paragraph itself has been dispatched.
+    """
+
+    def __init__(self):
+        self.offset = 0; self._previous = None # (ended with Enter, was blank) for the previous paragraph
+
+    def check(self, paragraph, plan):
+        """paragraph is the ParagraphModel (or raw line) the plan was made from."""
+        content = typed_paragraph_text(paragraph); blank = _is_blank(paragraph)
+        skipped = not isinstance(paragraph, str) and paragraph.skipped
+        if self._previous is not None:
+            entered, was_blank = self._previous
+            if entered != (not was_blank or not blank):
+                raise PlanVerificationError(f"Wrong paragraph break before character {self.offset}", self.offset)
+        document = ReplayDocument().replay(plan); actual = document.text()
+        if document.underflow:
+            raise PlanVerificationError(f"Backspace past the start of the paragraph at character {self.offset}", self.offset)
+        entered = not skipped and actual.endswith("\n") and actual[:-1] == content
+        if not entered:
+            offset = first_divergence(actual, content)
+            if offset is not None: raise _divergence_error(offset, actual, content, self.offset)
+        _check_released(document, self.offset)
+        self._previous = None if skipped else (entered, blank); self.offset += len(actual)
+
+    def finish(self):
+        if self._previous is not None and self._previous[0]:
+            raise PlanVerificationError(f"Extra paragraph break at the end (character {self.offset - 1})", self.offset - 1)
+
+
+# --- Duration Estimate ---
+
+ESTIMATE_MIN_ROUNDS = 50 # Simulated runs the time budget must allow before the whole document is simulated
+ESTIMATE_MIN_PARAGRAPHS = 16 # Smallest paragraph sample scaled up to a long document
+
+
+def estimate_duration(model, min_interval=1, max_interval=5, min_break=60, max_break=180,
+                      min_sentences_per_session=3, max_sentences_per_session=7, long_break_prob=0.1,
+                      long_break_min=900, long_break_max=2700, burst_prob=0.5, burst_length_min=2,
+                      burst_length_max=5, typo_prob=0.015, capitalization_error_prob=0.025,
+                      typing_speed_factor=1.0, runs=200, time_budget=1.0, seed=None):
+    """
+    Monte Carlo session duration for a DocumentModel: plans it up to `runs` times with the real planner
+    (NumPy sampling when available) within about time_budget seconds. Returns a dict of runs, mean, p50,
+    p90, p99 (seconds) and sampled_fraction. Documents too long to simulate ESTIMATE_MIN_ROUNDS times are
+    estimated from a random subset of paragraphs: paragraph durations are independent and add up, so each
+    run is scaled up by character count and its spread around the mean by 1/sqrt(fraction).
+    """
+    rng = random.Random(seed)
+    try: import numpy; numpy.random.default_rng(0).random(1); vectorized = True # Warm up outside the budget
+    except ImportError: vectorized = False
+    paragraphs = model.paragraphs
+    params = (min_interval, max_interval, min_break, max_break, min_sentences_per_session,
+              max_sentences_per_session, long_break_prob, long_break_min, long_break_max, burst_prob,
+              burst_length_min, burst_length_max, typo_prob, capitalization_error_prob, typing_speed_factor)
+
+    def simulate(subset):
+        plans = iter_paragraph_plans(subset, None, *params, rng.randrange(2**32), vectorized, model.factors)
+        return math.fsum(plan.total_delay() for _, plan in plans)
+
+    # Pilot over paragraphs in random order; what fits in its share of the budget is the sample
+    start = time.perf_counter(); pilot_end = start + time_budget / ESTIMATE_MIN_ROUNDS
+    order = list(range(len(paragraphs))); rng.shuffle(order); sampled = []
+    for index in order:
+        sampled.append(index); simulate([paragraphs[index]])
+        if len(sampled) >= ESTIMATE_MIN_PARAGRAPHS and time.perf_counter() > pilot_end: break
+    subset = [paragraphs[i] for i in sorted(sampled)]
+    fraction = sum(len(p.text) + 1 for p in subset) / max(1, sum(len(p.text) + 1 for p in paragraphs))
+
+    totals = [simulate(subset)]
+    while len(totals) < runs and time.perf_counter() - start < time_budget: totals.append(simulate(subset))
+    mean = math.fsum(totals) / len(totals)
+    if fraction < 1: totals = [mean / fraction + (t - mean) / math.sqrt(fraction) for t in totals]
+    totals.sort()
+
+    def percentile(q): return totals[max(0, math.ceil(q * len(totals)) - 1)]
+    return {"runs": len(totals), "mean": math.fsum(totals) / len(totals), "p50": percentile(0.5),
+            "p90": percentile(0.9), "p99": percentile(0.99), "sampled_fraction": fraction}
+
+
+# --- Clocks and Output Sinks ---
+# Dispatch only talks to a clock (time/monotonic/sleep) and a sink (press/release of plan
+# key codes), so the same plan can drive a real keyboard or run headless at CPU speed.
+
+class SystemClock:
+    """Wall-clock time; sleep() really sleeps."""
+    def time(self): return time.time()
+    def monotonic(self): return time.monotonic()
+    def sleep(self, seconds):
+        if seconds > 0: time.sleep(seconds)
+
+    async def asleep(self, seconds, wake=None):
+        """Awaitable sleep; returns early once the asyncio.Event wake is set."""
+        import asyncio
+        if wake is None: await asyncio.sleep(seconds); return
+        try: await asyncio.wait_for(wake.wait(), seconds)
+        except asyncio.TimeoutError: pass
+
+
+class VirtualClock:
+    """Simulated time starting at start (epoch seconds, default now); sleep() just advances it."""
+    def __init__(self, start=None):
+        self.start = time.time() if start is None else start; self.elapsed = 0.0
+    def time(self): return self.start + self.elapsed
+    def monotonic(self): return self.elapsed
+    def sleep(self, seconds):
+        if seconds > 0: self.elapsed += seconds
+
+    async def asleep(self, seconds, wake=None):
+        import asyncio
+        self.sleep(seconds); await asyncio.sleep(0) # Still yields, so control and status tasks get to run
+
+
+class OutputSink:
+    """Receives plan key codes (ord(char) or KEY_*) from the dispatcher."""
+    batch_sent = 0 # Keys of the current tap_batch already sent
+
+    def press(self, key): raise NotImplementedError
+    def release(self, key): raise NotImplementedError
+
+    def tap_batch(self, keys, delays, wait):
+        """
+        Taps a run of keys, calling wait(delay) after each. batch_sent is updated before each wait, so
+        the dispatcher knows where an interrupted or failed batch stopped. Override to send runs cheaply.
+        """
+        press = self.press; release = self.release
+        for i, key in enumerate(keys): press(key); release(key); self.batch_sent = i + 1; wait(delays[i])
+
+
+class PynputSink(OutputSink):
+    """Types into the active window through a pynput keyboard Controller."""
+
+    def __init__(self, controller=None):
+        import pynput.keyboard
+        self.controller = controller if controller is not None else pynput.keyboard.Controller()
+        self._special = {KEY_SPACE: pynput.keyboard.Key.space, KEY_BACKSPACE: pynput.keyboard.Key.backspace,
+                         KEY_ENTER: pynput.keyboard.Key.enter}
+
+    def _resolve(self, key): return self._special[key] if key < 0 else chr(key)
+    def press(self, key): self.controller.press(self._resolve(key))
+    def release(self, key): self.controller.release(self._resolve(key))
+
+    def tap_batch(self, keys, delays, wait):
+        """Resolves the whole run up front, then drives the controller in a tight loop."""
+        special = self._special; press = self.controller.press; release = self.controller.release
+        resolved = [special[key] if key < 0 else chr(key) for key in keys]
+        for i, key in enumerate(resolved): press(key); release(key); self.batch_sent = i + 1; wait(delays[i])
+
+
+class MemorySink(OutputSink):
+    """Records (timestamp, is_press, key) tuples in memory; timestamps come from clock if given."""
+
+    def __init__(self, clock=None):
+        self.clock = clock; self.events = []
+
+    def press(self, key): self.events.append((self.clock.time() if self.clock else None, True, key))
+    def release(self, key): self.events.append((self.clock.time() if self.clock else None, False, key))
+
+    def tap_batch(self, keys, delays, wait):
+        append = self.events.append; now = self.clock.time if self.clock else (lambda: None)
+        for i, key in enumerate(keys):
+            t = now(); append((t, True, key)); append((t, False, key)); self.batch_sent = i + 1; wait(delays[i])
+
+
+def _as_sink(keyboard):
+    """Accepts an OutputSink or a pynput-style controller (anything with press/release)."""
+    return keyboard if isinstance(keyboard, OutputSink) else PynputSink(keyboard)
+
+
+# --- Scheduling ---
+# Chaining thousands of short sleeps accumulates each sleep's overshoot plus the latency of the
+# keystroke calls. The scheduler instead sleeps until absolute monotonic deadlines, so lateness
+# is absorbed by the following delays, and skips sleeps too short for the OS timer to honour.
+
+# Shortest sleep worth asking the OS for; shorter waits are folded into later ones.
+TIMER_RESOLUTION = 0.0156 if sys.platform == "win32" and sys.version_info < (3, 11) else 0.001
+ERROR_SAMPLE_SIZE = 65536 # Interval errors kept for the p99 estimate
+MAX_CATCH_UP = 0.25 # Lateness beyond this (a stall, a suspended machine) re-anchors the schedule instead of being made up
+
+
+class DeadlineScheduler:
+    """Waits to cumulative monotonic deadlines and records requested vs achieved intervals."""
+
+    def __init__(self, clock, timer_resolution=TIMER_RESOLUTION):
+        self.clock = clock; self.timer_resolution = timer_resolution
+        self.start_time = None; self._deadline = None; self._last = None
+        self.requested_total = 0.0; self.waits = 0; self.error_total = 0.0; self.max_error = 0.0; self.reanchors = 0
+        self.errors = array.array("d") # Reservoir sample of (achieved - requested), for percentiles
+        self._reservoir_rng = random.Random(0)
+
+    def start(self):
+        self.start_time = self._deadline = self._last = self.clock.monotonic()
+
+    def wait(self, delay):
+        """Waits until delay seconds after the previous deadline (not after now); returns how late it finished."""
+        remaining = self._advance(delay)
+        if remaining >= self.timer_resolution: self.clock.sleep(remaining)
+        return self._record(delay)
+
+    async def wait_async(self, delay, control=None):
+        """
+        Awaitable wait(). With a SessionControl, a pause holds the wait and pushes every later deadline
+        back by the paused time, and a cancel raises SessionCancelled, both within milliseconds.
+        """
+        self._advance(delay)
+        while True:
+            if control is not None: await control.check(self)
+            remaining = self._deadline - self.clock.monotonic()
+            if remaining < self.timer_resolution: break
+            await self.clock.asleep(remaining, control.changed if control is not None else None)
+        return self._record(delay)
+
+    def _advance(self, delay):
+        """
+        Moves the deadline delay seconds on and returns the time left until it. When the previous
+        deadline was missed by more than MAX_CATCH_UP, the schedule restarts from now, so the keys
+        after a stall keep their spacing instead of firing back-to-back to catch up.
+        """
+        if self._deadline is None: self.start()
+        now = self.clock.monotonic()
+        if now - self._deadline > MAX_CATCH_UP: self._deadline = now; self.reanchors += 1
+        self._deadline += delay; self.requested_total += delay
+        return self._deadline - now
+
+    def shift(self, seconds):
+        """Moves the pending deadline (and the drift baseline) later, e.g. by the length of a pause."""
+        if self._deadline is None: return
+        self._deadline += seconds; self._last += seconds; self.start_time += seconds
+
+    def _record(self, delay):
+        now = self.clock.monotonic()
+        error = now - self._last - delay; self._last = now
+        self.waits += 1; self.error_total += error
+        if error > self.max_error or self.waits == 1: self.max_error = error
+        if len(self.errors) < ERROR_SAMPLE_SIZE: self.errors.append(error)
+        else: # Reservoir sampling keeps memory flat on arbitrarily long runs
+            slot = self._reservoir_rng.randrange(self.waits)
+            if slot < ERROR_SAMPLE_SIZE: self.errors[slot] = error
+        return now - self._deadline
+
+    def stats(self):
+        """Per-run timing stats in seconds: mean/p99/max interval error and cumulative drift."""
+        errors = sorted(self.errors); n = len(errors)
+        elapsed = (self._last - self.start_time) if self.waits else 0.0
+        return {"waits": self.waits, "requested": self.requested_total, "elapsed": elapsed, "reanchors": self.reanchors,
+                "mean_error": self.error_total / self.waits if self.waits else 0.0,
+                "p99_error": errors[min(n - 1, int(math.ceil(0.99 * n)) - 1)] if n else 0.0,
+                "max_error": self.max_error,
+                "drift": elapsed - self.requested_total}
+
+
+def format_timing_stats(stats):
+    return (f"{stats['waits']} waits, interval error mean {stats['mean_error'] * 1000:+.2f} ms, "
+            f"p99 {stats['p99_error'] * 1000:+.2f} ms, max {stats['max_error'] * 1000:+.2f} ms; "
+            f"cumulative drift {stats['drift'] * 1000:+.1f} ms"
+            + (f"; re-anchored after {stats['reanchors']} stall(s)" if stats.get("reanchors") else ""))
+
+
+# --- Metrics ---
+
+METRICS_INTERVAL = 10.0 # Clock seconds between progress events and Prometheus file rewrites
+LATENCY_BUCKETS = (1e-6, 5e-6, 1e-5, 5e-5, 1e-4, 5e-4, 1e-3, 5e-3, 0.01, 0.05, 0.1)
+OVERSHOOT_BUCKETS = (0.0, 1e-4, 5e-4, 1e-3, 2e-3, 5e-3, 0.01, 0.02, 0.05, 0.1)
+
+
+class Histogram:
+    """Prometheus-style histogram: fixed upper bounds plus +Inf, with sum and count."""
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds):
+        self.bounds = bounds; self.counts = [0] * (len(bounds) + 1); self.sum = 0.0; self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1; self.sum += value; self.count += 1
+
+    def prometheus(self, name):
+        lines = []; cumulative = 0
+        for bound, count in zip(self.bounds + (float("inf"),), self.counts):
+            cumulative += count; lines.append(f'{name}_bucket{{le="{"+Inf" if bound == float("inf") else repr(bound)}"}} {cumulative}')
+        return lines + [f"{name}_sum {self.sum!r}", f"{name}_count {self.count}"]
+
+
+class SessionMetrics:
+    """
+    Counters for a typing session: keys dispatched, sink call latency, sleep overshoot (how late each
+    wait finished), breaks and key errors by exception type. Non-key events (session start/end, breaks,
+    errors, periodic progress) are appended to a JSONL log; all counters are rewritten as a Prometheus
+    text file every METRICS_INTERVAL. Per key the cost is a perf_counter pair and a bisect.
+    """
+
+    def __init__(self, log_path=None, prometheus_path=None, interval=METRICS_INTERVAL):
+        self.log_path = log_path; self.prometheus_path = prometheus_path; self.interval = interval
+        self.keys = 0; self.errors = collections.Counter()
+        self.breaks = collections.Counter(); self.break_seconds = collections.Counter()
+        self.latency = Histogram(LATENCY_BUCKETS); self.overshoot = Histogram(OVERSHOOT_BUCKETS)
+        self.clock = None; self._log = None; self._started = None; self._next_flush = None
+        self._window_start = None; self._window_keys = 0; self._break_started = None
+
+    def begin(self, clock, **fields):
+        """Starts the session clock and logs a session_start event with fields."""
+        self.clock = clock; self._started = self._window_start = clock.monotonic()
+        self._next_flush = self._started + self.interval
+        if self.log_path:
+            try: self._log = open(self.log_path, "a", encoding="utf-8", buffering=1) # Line-buffered: survives crashes
+            except OSError as e: print(f"Warning: Could not open metrics log: {e}")
+        self.event("session_start", **fields)
+
+    def event(self, name, **fields):
+        if self._log is None: return
+        record = {"ts": self.clock.time(), "event": name}; record.update(fields)
+        try: self._log.write(json.dumps(record) + "\n")
+        except (OSError, TypeError, ValueError) as e: print(f"Warning: Could not write metrics event: {e}")
+
+    def key_dispatched(self, latency):
+        self.keys += 1; self.latency.observe(latency)
+
+    def key_error(self, key, error):
+        self.errors[type(error).__name__] += 1
+        self.event("key_error", key=key_label(key), type=type(error).__name__, message=str(error))
+
+    def wait_finished(self, late):
+        self.overshoot.observe(late)
+        if self.clock.monotonic() >= self._next_flush: self.flush()
+
+    def break_started(self, kind, duration):
+        self._break_started = self.clock.monotonic()
+        self.event("break_start", kind="long" if kind == BREAK_LONG else "short", planned=duration)
+
+    def break_ended(self, kind):
+        kind = "long" if kind == BREAK_LONG else "short"; actual = self.clock.monotonic() - self._break_started
+        self.breaks[kind] += 1; self.break_seconds[kind] += actual
+        self.event("break_end", kind=kind, actual=actual)
+
+    @property
+    def elapsed(self): return self.clock.monotonic() - self._started if self._started is not None else 0.0
+
+    @property
+    def keys_per_second(self): return self.keys / self.elapsed if self.elapsed > 0 else 0.0
+
+    def flush(self):
+        """Logs a progress event with the keys/s since the last one and rewrites the Prometheus file."""
+        now = self.clock.monotonic(); window = now - self._window_start
+        self.event("progress", keys=self.keys, elapsed=self.elapsed,
+                   keys_per_second=(self.keys - self._window_keys) / window if window > 0 else 0.0)
+        self._window_start = now; self._window_keys = self.keys; self._next_flush = now + self.interval
+        self.write_prometheus()
+
+    def finish(self, status="completed", **fields):
+        """Logs session_end with a summary, writes the final Prometheus file and closes the log."""
+        self.event("session_end", status=status, keys=self.keys, elapsed=self.elapsed,
+                   keys_per_second=self.keys_per_second, errors=dict(self.errors), **fields)
+        self.write_prometheus()
+        if self._log is not None: self._log.close(); self._log = None
+
+    def prometheus(self):
+        """Current counters in the Prometheus text exposition format."""
+        def header(name, kind, text): return [f"# HELP {name} {text}", f"# TYPE {name} {kind}"]
+        lines = header("docusim_keys_dispatched_total", "counter", "Keys sent to the output sink.")
+        lines.append(f"docusim_keys_dispatched_total {self.keys}")
+        lines += header("docusim_keys_per_second", "gauge", "Keys dispatched per second of session time.")
+        lines.append(f"docusim_keys_per_second {self.keys_per_second!r}")
+        lines += header("docusim_session_elapsed_seconds", "gauge", "Session time so far.")
+        lines.append(f"docusim_session_elapsed_seconds {self.elapsed!r}")
+        lines += header("docusim_dispatch_latency_seconds", "histogram", "Time spent in sink press/release per key.")
+        lines += self.latency.prometheus("docusim_dispatch_latency_seconds")
+        lines += header("docusim_sleep_overshoot_seconds", "histogram", "How late each wait finished past its deadline.")
+        lines += self.overshoot.prometheus("docusim_sleep_overshoot_seconds")
+        lines += header("docusim_breaks_total", "counter", "Breaks taken, by kind.")
+        lines += [f'docusim_breaks_total{{kind="{kind}"}} {self.breaks[kind]}' for kind in ("short", "long")]
+        lines += header("docusim_break_seconds_total", "counter", "Time spent on breaks, by kind.")
+        lines += [f'docusim_break_seconds_total{{kind="{kind}"}} {self.break_seconds[kind]!r}' for kind in ("short", "long")]
+        lines += header("docusim_key_errors_total", "counter", "Keys the sink failed to send, by exception type.")
+        lines += [f'docusim_key_errors_total{{type="{name}"}} {count}' for name, count in sorted(self.errors.items())]
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self):
+        if not self.prometheus_path: return
+        try: atomic_write_bytes(self.prometheus_path, self.prometheus().encode("utf-8"), durable=False) # Rewritten often; losing one is harmless
+        except OSError as e: print(f"\nWarning: Could not write metrics file: {e}")
+
+
+# --- Checkpoints ---
+
+CHECKPOINT_VERSION = 2
+CHECKPOINT_INTERVAL = 5.0 # Clock seconds between periodic saves; at most this much is retyped after a hard crash
+
+
+def default_checkpoint_path():
+    return os.path.join(get_cache_dir(), "session-checkpoint.json")
+
+
+def document_key(text):
+    """SHA-1 of a document (a string, or an open file read in chunks), to check that a resume types the same text."""
+    digest = hashlib.sha1()
+    if isinstance(text, str): digest.update(text.encode("utf-8"))
+    else:
+        for chunk in iter(lambda: text.read(1 << 20), ""): digest.update(chunk.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def file_key(path):
+    """Cheap identity of an input file (size and SHA-1 of its first chunk); the rest is checked on resume."""
+    with open(path, "rb") as f: return f"{os.fstat(f.fileno()).st_size}:{hashlib.sha1(f.read(1 << 20)).hexdigest()}"
+
+
+class HashingLines:
+    """Iterates the lines of a text stream, keeping a SHA-1 of the lines read so far (see SessionCheckpoint.read)."""
+
+    def __init__(self, stream): self.stream = stream; self.lines = 0; self.digest = hashlib.sha1()
+
+    def __iter__(self):
+        for line in self.stream: self.digest.update(line.encode("utf-8")); self.lines += 1; yield line
+
+    @property
+    def state(self): return [self.lines, self.digest.hexdigest()]
+
+
+def read_matches(stream, read):
+    """True if the first read[0] lines of stream hash to read[1], as recorded by HashingLines."""
+    lines = HashingLines(stream); it = iter(lines)
+    while lines.lines < read[0] and next(it, None) is not None: pass
+    return lines.state == list(read)
+
+
+class SessionCheckpoint:
+    """
+    Typing progress of one session, saved atomically as JSON: the paragraph being typed, how many of
+    its planned events were dispatched, the characters before it, the planner RNG states at its start
+    (see iter_paragraph_plans state=) and the elapsed session time. Saved every CHECKPOINT_INTERVAL,
+    before each break and when the session stops. Resuming re-plans the paragraph from the saved RNG
+    state and skips the dispatched events, so nothing is typed twice. A streamed input file also records
+    the SHA-1 of the lines read so far (source, a HashingLines), which --resume checks against the file.
+    """
+
+    def __init__(self, path, key, seed, params, interval=CHECKPOINT_INTERVAL):
+        self.path = path; self.key = key; self.seed = seed; self.params = dict(params); self.interval = interval
+        self.planner_state = {} # Shared with iter_paragraph_plans; a loaded state makes it resume
+        self.position = {}; self.event = 0; self.elapsed = 0.0
+        self.clock = None; self._started = None; self._next_save = None; self.elapsed_before = 0.0
+        self.source = None; self.read = None
+
+    @classmethod
+    def load(cls, path):
+        """Returns the checkpoint saved at path, or None (with a message) if it is missing or unreadable."""
+        try:
+            with open(path, "r", encoding="utf-8") as f: data = json.load(f)
+            if data.get("version") != CHECKPOINT_VERSION: print(f"Checkpoint {path} is from another version."); return None
+            checkpoint = cls(path, data["key"], data["seed"], data["params"])
+            version, internal, gauss_next = data["random"]
+            checkpoint.planner_state = {"paragraph": data["paragraph"], "chars": data["chars"],
+                                        "random": (version, tuple(internal), gauss_next), "numpy": data["numpy"]}
+            checkpoint.position = dict(checkpoint.planner_state)
+            checkpoint.event = data["event"]; checkpoint.elapsed = data["elapsed"]; checkpoint.read = data.get("read")
+            return checkpoint
+        except FileNotFoundError: print(f"No checkpoint found at {path}."); return None
+        except (OSError, ValueError, KeyError, TypeError) as e: print(f"Could not read checkpoint {path}: {e}"); return None
+
+    @property
+    def resumed(self): return bool(self.position)
+
+    def begin(self, clock):
+        """Starts timing this run; elapsed time carries on from the saved session."""
+        self.clock = clock; self._started = clock.monotonic(); self._next_save = self._started + self.interval
+        self.elapsed_before = self.elapsed
+
+    def enter_paragraph(self, event=0):
+        """Records that the planner's current paragraph is being dispatched from event onwards."""
+        self.position = dict(self.planner_state); self.event = event
+
+    def progress(self, event, save=False):
+        """Records that event (an index into the paragraph's plan) was dispatched; saves when due."""
+        self.event = event
+        if save or self.clock.monotonic() >= self._next_save: self.save()
+
+    def save(self):
+        if not self.position: return # Nothing dispatched yet
+        now = self.clock.monotonic(); self.elapsed = self.elapsed_before + now - self._started
+        version, internal, gauss_next = self.position["random"]
+        data = {"version": CHECKPOINT_VERSION, "key": self.key, "seed": self.seed, "params": self.params,
+                "paragraph": self.position["paragraph"], "event": self.event, "chars": self.position["chars"],
+                "random": [version, list(internal), gauss_next], "numpy": self.position["numpy"],
+                "elapsed": self.elapsed, "saved_at": self.clock.time()}
+        if self.source is not None: data["read"] = self.source.state
+        try: atomic_write_bytes(self.path, json.dumps(data).encode("utf-8"))
+        except OSError as e: print(f"\nWarning: Could not save checkpoint: {e}")
+        self._next_save = now + self.interval
+
+    def clear(self):
+        try: os.remove(self.path)
+        except OSError: pass
+
+
+# --- Dispatch ---
+
+BATCH_MAX_DELAY = 0.5 # Consecutive key taps at most this far apart are sent to the sink as one run
+BATCH_MIN_KEYS = 2
+
+
+def _dispatch_batch(plan, first, end, sink, wait, checkpoint, metrics):
+    """Sends key taps first..end-1 through sink.tap_batch; returns the index to continue from."""
+    if metrics is None: batch_wait = wait
+    else: # Per-key sink latency is the time between one wait returning and the next starting
+        perf_counter = time.perf_counter; mark = perf_counter()
+        def batch_wait(delay):
+            nonlocal mark
+            metrics.key_dispatched(perf_counter() - mark); metrics.wait_finished(wait(delay)); mark = perf_counter()
+    sink.batch_sent = 0
+    try: sink.tap_batch(plan.keys[first:end], plan.delays[first:end], batch_wait)
+    except Exception as e: # A key failed: report it, wait out its delay and carry on after it
+        failed = first + sink.batch_sent; key = plan.keys[failed]
+        print(f"\nERROR typing {key_label(key)!r}: {e}")
+        if metrics is not None: metrics.key_error(key, e)
+        if checkpoint is not None: checkpoint.progress(failed + 1)
+        late = wait(plan.delays[failed])
+        if metrics is not None: metrics.wait_finished(late)
+        return failed + 1
+    except BaseException:
+        if checkpoint is not None: checkpoint.progress(first + sink.batch_sent) # Exactly what was typed
+        raise
+    if checkpoint is not None: checkpoint.progress(end)
+    return end
+
+
+def dispatch_plan(plan, sink, clock=None, scheduler=None, checkpoint=None, start=0, metrics=None, batch=True):
+    """
+    Executes a keystroke plan on sink, timed by a DeadlineScheduler on clock. No random or frequency
+    work happens here. Returns the scheduler; its stats() cover every plan it has timed.
+    Runs of key taps with short delays (bursts, words) go to sink.tap_batch unless batch=False;
+    everything else is sent event by event. Events before start are skipped; checkpoint (a SessionCheckpoint) is told of each
+    dispatched event and metrics (a begun SessionMetrics) of each key, error, wait and break.
+    """
+    if scheduler is None: scheduler = DeadlineScheduler(clock or SystemClock())
+    wait = scheduler.wait # Starts on the first wait; pass one scheduler to keep deadlines across plans
+    perf_counter = time.perf_counter
+    actions = plan.actions; keys = plan.keys; delays = plan.delays; count = len(actions); index = start
+    while index < count:
+        action = actions[index]; key = keys[index]; delay = delays[index]
+        if batch and action == EV_KEY and 0 < delay <= BATCH_MAX_DELAY: # Find the run of short key taps starting here
+            end = index + 1
+            while end < count and actions[end] == EV_KEY and 0 < delays[end] <= BATCH_MAX_DELAY: end += 1
+            if end - index >= BATCH_MIN_KEYS:
+                index = _dispatch_batch(plan, index, end, sink, wait, checkpoint, metrics); continue
+        index += 1
+        if action == EV_KEY or action == EV_PRESS:
+            if metrics is not None: sent_at = perf_counter()
+            try:
+                sink.press(key)
+                if action == EV_KEY: sink.release(key)
+            except Exception as e:
+                print(f"\nERROR typing {key_label(key)!r}: {e}")
+                if metrics is not None: metrics.key_error(key, e)
+            else:
+                if metrics is not None: metrics.key_dispatched(perf_counter() - sent_at) # Failed keys count as errors only
+        elif action == EV_BREAK:
+            if checkpoint is not None: checkpoint.progress(index, save=True) # A resume won't repeat the break
+            print(f"\nTaking a {'long' if key == BREAK_LONG else 'short'} break for {format_duration(delay)}...")
+            if metrics is None: wait(delay)
+            else: metrics.break_started(key, delay); metrics.wait_finished(wait(delay)); metrics.break_ended(key)
+            print("Resuming typing...")
+            continue
+        if checkpoint is not None: checkpoint.progress(index) # Before the wait, so the key isn't retyped
+        if delay > 0:
+            late = wait(delay)
+            if metrics is not None: metrics.wait_finished(late)
+    return scheduler
+
+
+# --- Core Typing Simulation Functions ---
+
+def type_word(word, keyboard, word_freq, typo_prob, capitalization_error_prob, typing_speed_factor, clock=None):
+    """Types a word char by char with delays, simulating and IMMEDIATELY correcting typos/caps errors."""
+    plan = KeystrokePlan()
+    plan_word(plan, word, word_freq, typo_prob, capitalization_error_prob, typing_speed_factor)
+    dispatch_plan(plan, _as_sink(keyboard), clock)
+
+
+def type_sentence(sentence, keyboard, word_freq, burst_prob, burst_length_min, burst_length_max,
+                  typo_prob, capitalization_error_prob, typing_speed_factor, clock=None):
+    """Types a sentence using word typer, handling bursts and spacing between words."""
+    plan = KeystrokePlan()
+    plan_sentence(plan, sentence, word_freq, burst_prob, burst_length_min, burst_length_max,
+                  typo_prob, capitalization_error_prob, typing_speed_factor)
+    dispatch_plan(plan, _as_sink(keyboard), clock)
+
+
+def _start_session(text, word_freq, planner_args, seed, clock, checkpoint):
+    """
+    Shared session setup: analyzes the text (or prepares to stream it) and prints the estimate.
+    planner_args are iter_paragraph_plans' parameters from min_interval to typing_speed_factor.
+    """
+    streaming = not isinstance(text, str)
+    if streaming: # Paragraphs are read, analyzed and planned lazily while typing
+        print(f"\nStreaming input; planning keystrokes paragraph by paragraph (seed {seed}).")
+        paragraphs = text; factors = None
+    else:
+        print(f"\nAnalyzing text (seed {seed})...")
+        model = analyze_document(text, word_freq) # Shared by the planner and the estimate below
+        paragraphs = model.paragraphs; factors = model.factors
+    resumed = checkpoint is not None and checkpoint.resumed
+    if resumed:
+        print(f"Resuming at paragraph {checkpoint.position['paragraph'] + 1}, character {checkpoint.position['chars']} "
+              f"({format_duration(checkpoint.elapsed)} already typed).")
+        if not streaming: model = DocumentModel(model.paragraphs[checkpoint.position["paragraph"]:], model.factors) # Estimate what's left
+
+    # --- Calculate Estimate ---
+    estimated_duration_str = "Unknown"
+    formatted_completion_time = "Unknown"; formatted_completion_range = None
+    if streaming: estimated_duration_str = "Unknown (streaming input)"
+    elif model.num_chars == 0: estimated_duration_str = "0s"; formatted_completion_time = "N/A (No text)"
+    else:
+        try:
+            if model.num_sentences == 0: print("Warning: Text found but could not tokenize into sentences for full estimate.")
+            estimate = estimate_duration(model, *planner_args, seed=seed)
+            start_timestamp = clock.time()
+            completion = {q: datetime.datetime.fromtimestamp(start_timestamp + estimate[q]).strftime("%Y-%m-%d %H:%M:%S")
+                          for q in ("p50", "p90", "p99")}
+            estimated_duration_str = (f"{format_duration(estimate['p50'])} (p90 {format_duration(estimate['p90'])}, "
+                                      f"p99 {format_duration(estimate['p99'])}; {estimate['runs']} simulated runs)")
+            formatted_completion_time = completion["p50"]
+            formatted_completion_range = f"p90 {completion['p90']}, p99 {completion['p99']}"
+        except Exception as est_err:
+            print(f"\nWarning: Could not calculate time estimate: {est_err}")
+    # --- End Estimate ---
+
+    print(f"\nCurrent Time: {datetime.datetime.fromtimestamp(clock.time()).strftime('%Y-%m-%d %H:%M:%S')}")
+    print(f"Estimated Total Duration: ~{estimated_duration_str}")
+    print(f"Estimated Completion Time: ~{formatted_completion_time}" +
+          (f" ({formatted_completion_range})" if formatted_completion_range else ""))
+    return types.SimpleNamespace(paragraphs=paragraphs, factors=factors, streaming=streaming, resumed=resumed,
+                                 completion=formatted_completion_time, start_time=None)
+
+
+def _begin_session(session, clock, seed, vectorized, checkpoint, metrics):
+    session.start_time = clock.time()
+    if checkpoint is not None: checkpoint.begin(clock)
+    if metrics is not None:
+        metrics.begin(clock, seed=seed, vectorized=vectorized, streaming=session.streaming, resumed=session.resumed)
+
+
+def _session_plans(session, word_freq, planner_args, seed, vectorized, checkpoint):
+    """
+    Yields (KeystrokePlan, first event to dispatch) per paragraph, continuing a loaded checkpoint.
+    Each plan is replayed and checked against its paragraph first (PlanVerificationError if it diverges).
+    """
+    planner_state = None; verifier = PlanVerifier()
+    if checkpoint is not None:
+        planner_state = checkpoint.planner_state; resume_event = checkpoint.event if session.resumed else 0
+        resume_chars = checkpoint.position.get("chars")
+    for paragraph, plan in iter_paragraph_plans(session.paragraphs, word_freq, *planner_args, seed, vectorized,
+                                                session.factors, planner_state):
+        verifier.check(paragraph, plan); start = 0
+        if checkpoint is not None:
+            if resume_chars is not None: # First paragraph after a resume
+                if planner_state["chars"] != resume_chars: raise ValueError("Text does not match the checkpoint; not resuming.")
+                start = resume_event; resume_chars = None
+            checkpoint.enter_paragraph(start)
+        yield plan, start
+    verifier.finish()
+
+
+def _abort_session(checkpoint, metrics, error, status=None):
+    if checkpoint is not None and checkpoint.position:
+        if isinstance(error, PlanVerificationError): checkpoint.clear() # A resume would stop at the same plan
+        else: checkpoint.save(); print(f"\nProgress saved to {checkpoint.path}; run again with --resume to continue.")
+    if metrics is not None:
+        if status is None: status = "interrupted" if isinstance(error, KeyboardInterrupt) else "failed"
+        metrics.finish(status, error=repr(error))
+
+
+def _finish_session(session, clock, scheduler, events_dispatched, checkpoint, metrics):
+    """Clears the checkpoint, closes metrics and prints the summary; returns the session duration."""
+    if checkpoint is not None: checkpoint.clear()
+    timing_stats = scheduler.stats()
+    if metrics is not None: metrics.finish(events=events_dispatched, timing=timing_stats)
+
+    actual_end_time = clock.time()
+    actual_total_duration = actual_end_time - session.start_time
     print(f"\nTyping complete.")
+    if session.resumed:
+        print(f"Resumed Run Duration: {format_duration(actual_total_duration)}")
+        actual_total_duration += checkpoint.elapsed_before
     print(f"Actual Total Duration: {format_duration(actual_total_duration)}")
-    if formatted_completion_time != "Unknown" and formatted_completion_time != "N/A (No text)":
-         print(f"(Original Estimated Completion Time was: ~{formatted_completion_time})")
+    print(f"Dispatched {events_dispatched} keystroke events.")
+    print(f"Timing: {format_timing_stats(timing_stats)}")
+    if session.completion != "Unknown" and session.completion != "N/A (No text)":
+         print(f"(Original Estimated Completion Time was: ~{session.completion})")
+    return actual_total_duration
+
+
+def falsify_google_docs_history(text, word_freq, min_interval=1, max_interval=5, min_break=60, max_break=180,
+                                min_sentences_per_session=3, max_sentences_per_session=7, long_break_prob=0.1,
+                                long_break_min=900, long_break_max=2700, burst_prob=0.5, burst_length_min=2,
+                                burst_length_max=5, typo_prob=0.015, capitalization_error_prob=0.025,
+                                typing_speed_factor=1.0, seed=None, clock=None, sink=None, vectorized=False,
+                                checkpoint=None, metrics=None):
+    """
+    Main simulation loop: plans paragraphs, sentences, sessions and breaks, prints estimates, then types.
+    text is a string, or an iterable of paragraph lines (see iter_paragraphs) to stream a large document
+    with bounded memory; each paragraph is planned just before it is typed.
+    clock defaults to SystemClock and sink to a PynputSink on the active window; pass VirtualClock and
+    MemorySink to run the same session headless at CPU speed. Returns the session duration in clock seconds.
+    checkpoint (a SessionCheckpoint) saves progress while typing and is cleared when the session completes;
+    a loaded one resumes where it stopped (pass the same text, seed and parameters).
+    metrics (a SessionMetrics) collects counters and logs session, break and error events while typing.
+    """
+    if clock is None: clock = SystemClock()
+    if sink is None:
+        try: sink = PynputSink()
+        except Exception as e: print(f"\nFATAL ERROR: Keyboard controller init failed: {e}"); sys.exit(1)
+    if seed is None: seed = random.randrange(2**32)
+    planner_args = (min_interval, max_interval, min_break, max_break, min_sentences_per_session,
+                    max_sentences_per_session, long_break_prob, long_break_min, long_break_max, burst_prob,
+                    burst_length_min, burst_length_max, typo_prob, capitalization_error_prob, typing_speed_factor)
+    session = _start_session(text, word_freq, planner_args, seed, clock, checkpoint)
+    print("\nYou have 5 seconds to switch to the target window...")
+    clock.sleep(5)
+    print("Starting typing simulation...")
+
+    # --- Main Typing Loop ---
+    scheduler = DeadlineScheduler(clock); events_dispatched = 0
+    _begin_session(session, clock, seed, vectorized, checkpoint, metrics)
+    try:
+        for paragraph_plan, start in _session_plans(session, word_freq, planner_args, seed, vectorized, checkpoint):
+            dispatch_plan(paragraph_plan, sink, clock, scheduler, checkpoint, start, metrics)
+            events_dispatched += len(paragraph_plan) - start
+    except BaseException as e: _abort_session(checkpoint, metrics, e); raise
+    return _finish_session(session, clock, scheduler, events_dispatched, checkpoint, metrics)
+
+
+# --- Asyncio Engine ---
+# Same plans and timing as above, but every wait is awaitable: a SessionControl can pause, resume or
+# cancel a session within milliseconds, even in the middle of a long break, and a status task reports
+# progress alongside the typing without extra threads.
+
+STATUS_INTERVAL = 60.0 # Real seconds between status lines
+
+
+class SessionCancelled(Exception):
+    """Raised inside an async session when its SessionControl is cancelled."""
+
+
+class SessionControl:
+    """Pause/resume/cancel for async sessions. Create it inside the running event loop."""
+
+    def __init__(self):
+        import asyncio
+        self.changed = asyncio.Event() # Set on every command; wakes sleeping waits
+        self._resumed = asyncio.Event(); self._resumed.set()
+        self.cancelled = False; self.paused_total = 0.0
+
+    @property
+    def paused(self): return not self._resumed.is_set()
+
+    def pause(self): self._resumed.clear(); self.changed.set()
+    def resume(self): self._resumed.set(); self.changed.set()
+    def cancel(self): self.cancelled = True; self._resumed.set(); self.changed.set()
+
+    async def check(self, scheduler):
+        """Holds while paused, shifting scheduler's deadlines by the pause; raises SessionCancelled once cancelled."""
+        self.changed.clear()
+        if self.paused:
+            paused_at = scheduler.clock.monotonic()
+            await self._resumed.wait(); self.changed.clear()
+            paused = scheduler.clock.monotonic() - paused_at
+            self.paused_total += paused; scheduler.shift(paused)
+        if self.cancelled: raise SessionCancelled()
+
+
+async def dispatch_plan_async(plan, sink, clock=None, scheduler=None, control=None, checkpoint=None, start=0,
+                              metrics=None, progress=None):
+    """
+    Awaitable dispatch_plan: same events and timing, event by event, with every wait (breaks included)
+    interruptible through control. progress, if given, has .keys and .state updated as it goes.
+    """
+    if scheduler is None: scheduler = DeadlineScheduler(clock or SystemClock())
+    wait = scheduler.wait_async; perf_counter = time.perf_counter
+    actions = plan.actions; keys = plan.keys; delays = plan.delays
+    for index in range(start, len(actions)):
+        action = actions[index]; key = keys[index]; delay = delays[index]
+        if action == EV_KEY or action == EV_PRESS:
+            if metrics is not None: sent_at = perf_counter()
+            try:
+                sink.press(key)
+                if action == EV_KEY: sink.release(key)
+            except Exception as e:
+                print(f"\nERROR typing {key_label(key)!r}: {e}")
+                if metrics is not None: metrics.key_error(key, e)
+            else:
+                if metrics is not None: metrics.key_dispatched(perf_counter() - sent_at) # Failed keys count as errors only
+            if progress is not None: progress.keys += 1
+        elif action == EV_BREAK:
+            if checkpoint is not None: checkpoint.progress(index + 1, save=True)
+            print(f"\nTaking a {'long' if key == BREAK_LONG else 'short'} break for {format_duration(delay)}...")
+            if progress is not None: progress.state = "on a break"
+            if metrics is not None: metrics.break_started(key, delay)
+            late = await wait(delay, control)
+            if metrics is not None: metrics.wait_finished(late); metrics.break_ended(key)
+            if progress is not None: progress.state = "typing"
+            print("Resuming typing...")
+            continue
+        if checkpoint is not None: checkpoint.progress(index + 1)
+        if delay > 0:
+            late = await wait(delay, control)
+            if metrics is not None: metrics.wait_finished(late)
+    return scheduler
+
+
+async def type_word_async(word, keyboard, word_freq, typo_prob, capitalization_error_prob, typing_speed_factor,
+                          clock=None, control=None):
+    """Awaitable type_word; control (a SessionControl) can pause or cancel it."""
+    plan = KeystrokePlan()
+    plan_word(plan, word, word_freq, typo_prob, capitalization_error_prob, typing_speed_factor)
+    await dispatch_plan_async(plan, _as_sink(keyboard), clock, control=control)
+
+
+async def type_sentence_async(sentence, keyboard, word_freq, burst_prob, burst_length_min, burst_length_max,
+                              typo_prob, capitalization_error_prob, typing_speed_factor, clock=None, control=None):
+    """Awaitable type_sentence; control (a SessionControl) can pause or cancel it."""
+    plan = KeystrokePlan()
+    plan_sentence(plan, sentence, word_freq, burst_prob, burst_length_min, burst_length_max,
+                  typo_prob, capitalization_error_prob, typing_speed_factor)
+    await dispatch_plan_async(plan, _as_sink(keyboard), clock, control=control)
+
+
+def format_status(progress, control, clock, session):
+    state = "paused" if control.paused else progress.state
+    elapsed = clock.time() - session.start_time if session.start_time is not None else 0.0
+    return (f"[status] {state}: {progress.keys} keys in {format_duration(elapsed)}, paragraph {progress.paragraphs + 1}"
+            + (f", paused {format_duration(control.paused_total)} so far" if control.paused_total else ""))
+
+
+async def _report_status(progress, control, clock, session, interval):
+    import asyncio
+    while True: await asyncio.sleep(interval); print(format_status(progress, control, clock, session))
+
+
+def _attach_commands(loop, control, show_status):
+    """Reads p/r/c/s commands from an interactive stdin via the event loop; False where unsupported."""
+    try:
+        if not sys.stdin.isatty(): return False
+        fd = sys.stdin.fileno()
+    except (AttributeError, ValueError, OSError): return False
+
+    def on_input():
+        command = sys.stdin.readline().strip().lower()[:1]
+        if command == "p": control.pause(); print("Paused. Enter r to resume, c to cancel.")
+        elif command == "r": control.resume(); print("Resumed.")
+        elif command in ("c", "q"): control.cancel(); print("Cancelling...")
+        elif command == "s": show_status()
+        elif command: print("Commands: p = pause, r = resume, c = cancel, s = status")
+    try: loop.add_reader(fd, on_input)
+    except (NotImplementedError, OSError, ValueError): return False # e.g. Windows' proactor loop
+    return True
+
+
+async def falsify_google_docs_history_async(text, word_freq, min_interval=1, max_interval=5, min_break=60,
+                                            max_break=180, min_sentences_per_session=3, max_sentences_per_session=7,
+                                            long_break_prob=0.1, long_break_min=900, long_break_max=2700,
+                                            burst_prob=0.5, burst_length_min=2, burst_length_max=5,
+                                            typo_prob=0.015, capitalization_error_prob=0.025,
+                                            typing_speed_factor=1.0, seed=None, clock=None, sink=None,
+                                            vectorized=False, checkpoint=None, metrics=None, control=None,
+                                            status_interval=STATUS_INTERVAL, commands=True):
+    """
+    Asyncio version of falsify_google_docs_history (same arguments and plans). control (a
+    SessionControl, created if None) pauses, resumes or cancels it at any wait; with commands=True and
+    an interactive stdin, p/r/c/s lines typed in the terminal drive it. A status line is printed every
+    status_interval seconds. A cancelled session saves its checkpoint, like an interrupted one, and
+    returns the time typed so far.
+    """
+    import asyncio
+    if clock is None: clock = SystemClock()
+    if sink is None:
+        try: sink = PynputSink()
+        except Exception as e: print(f"\nFATAL ERROR: Keyboard controller init failed: {e}"); sys.exit(1)
+    if seed is None: seed = random.randrange(2**32)
+    if control is None: control = SessionControl()
+    planner_args = (min_interval, max_interval, min_break, max_break, min_sentences_per_session,
+                    max_sentences_per_session, long_break_prob, long_break_min, long_break_max, burst_prob,
+                    burst_length_min, burst_length_max, typo_prob, capitalization_error_prob, typing_speed_factor)
+    session = _start_session(text, word_freq, planner_args, seed, clock, checkpoint)
+    progress = types.SimpleNamespace(keys=0, paragraphs=0, state="typing")
+    def show_status(): print(format_status(progress, control, clock, session))
+
+    loop = asyncio.get_running_loop()
+    has_commands = commands and _attach_commands(loop, control, show_status)
+    if has_commands: print("\nCommands (type + Enter in this terminal): p = pause, r = resume, c = cancel, s = status")
+    status_task = loop.create_task(_report_status(progress, control, clock, session, status_interval))
+    scheduler = DeadlineScheduler(clock); events_dispatched = 0
+    try:
+        print("\nYou have 5 seconds to switch to the target window...")
+        await scheduler.wait_async(5, control); scheduler = DeadlineScheduler(clock) # Countdown is cancellable too
+        print("Starting typing simulation...")
+        _begin_session(session, clock, seed, vectorized, checkpoint, metrics)
+        try:
+            for paragraph_plan, start in _session_plans(session, word_freq, planner_args, seed, vectorized, checkpoint):
+                await dispatch_plan_async(paragraph_plan, sink, clock, scheduler, control, checkpoint, start,
+                                          metrics, progress)
+                events_dispatched += len(paragraph_plan) - start; progress.paragraphs += 1
+        except SessionCancelled as e:
+            _abort_session(checkpoint, metrics, e, "cancelled"); duration = clock.time() - session.start_time
+            print(f"\nTyping cancelled after {format_duration(duration)} ({events_dispatched} events).")
+            return duration
+        except (KeyboardInterrupt, asyncio.CancelledError) as e: _abort_session(checkpoint, metrics, e, "interrupted"); raise
+        except BaseException as e: _abort_session(checkpoint, metrics, e); raise
+    except SessionCancelled: print("\nCancelled before typing started."); return 0.0
+    finally:
+        status_task.cancel()
+        if has_commands: loop.remove_reader(sys.stdin.fileno())
+    return _finish_session(session, clock, scheduler, events_dispatched, checkpoint, metrics)
+
+
+# --- Batch Timeline Generation ---
+# Offline mode for research datasets: no keyboard, virtual time, many documents x parameter sets in a
+# process pool. Each run's keystrokes become a timestamped edit timeline (insert/delete at the cursor).
+
+TIMELINE_PARAMS = ("min_interval", "max_interval", "min_break", "max_break", "min_sentences_per_session",
+                   "max_sentences_per_session", "long_break_prob", "long_break_min", "long_break_max",
+                   "burst_prob", "burst_length_min", "burst_length_max", "typo_prob",
+                   "capitalization_error_prob", "typing_speed_factor", "vectorized")
+_EDIT_OPS = {KEY_BACKSPACE: ("delete", ""), KEY_ENTER: ("insert", "\n"), KEY_SPACE: ("insert", " ")}
+_timeline_worker = {} # Per worker process: word frequencies and the last analyzed document
+
+
+def _init_timeline_worker(word_freq, documents):
+    """Pool initializer. A WordFrequencyTable arrives as its path and reloads the same cached file."""
+    _timeline_worker.update(word_freq=word_freq, documents=documents, model=(None, None))
+
+
+def _timeline_seed(seed, run): return (seed * 1_000_003 + run) % 2**32
+
+
+def simulate_timeline(model, word_freq, params, seed):
+    """Types an analyzed document headless; returns (duration, times, ops, texts) for each key press."""
+    clock = VirtualClock(start=0.0); sink = MemorySink(clock); scheduler = DeadlineScheduler(clock)
+    params = dict(params); vectorized = params.pop("vectorized", False)
+    with contextlib.redirect_stdout(io.StringIO()): # Break announcements
+        for _, plan in iter_paragraph_plans(model.paragraphs, word_freq, **params, seed=seed,
+                                            vectorized=vectorized, factors=model.factors):
+            dispatch_plan(plan, sink, clock, scheduler)
+    times = []; ops = []; texts = []
+    for timestamp, is_press, key in sink.events:
+        if not is_press: continue
+        op, text = _EDIT_OPS.get(key) or ("insert", chr(key))
+        times.append(timestamp); ops.append(op); texts.append(text)
+    return clock.elapsed, times, ops, texts
+
+
+def _run_timeline(task):
+    run, document_index, params_index, params, seed = task
+    cached_index, model = _timeline_worker["model"]
+    if cached_index != document_index: # Tasks arrive grouped by document, so each is analyzed about once per worker
+        with open(_timeline_worker["documents"][document_index], "r", encoding="utf-8") as f: text = f.read()
+        model = analyze_document(text, _timeline_worker["word_freq"]); _timeline_worker["model"] = (document_index, model)
+    duration, times, ops, texts = simulate_timeline(model, _timeline_worker["word_freq"], params, seed)
+    return {"run": run, "document": _timeline_worker["documents"][document_index], "params_id": params_index,
+            "params": params, "seed": seed, "duration": duration, "t": times, "op": ops, "text": texts}
+
+
+def _write_timelines_jsonl(path, results):
+    with open(path, "w", encoding="utf-8") as f:
+        for record in results: f.write(json.dumps(record) + "\n"); yield record
+
+
+def _write_timelines_parquet(path, results):
+    """One row per edit, with the run's metadata repeated (dictionary-encoded by Parquet)."""
+    import pyarrow, pyarrow.parquet
+    schema = pyarrow.schema([("run", pyarrow.int64()), ("document", pyarrow.string()), ("params_id", pyarrow.int32()),
+                             ("params", pyarrow.string()), ("seed", pyarrow.int64()), ("t", pyarrow.float64()),
+                             ("op", pyarrow.string()), ("text", pyarrow.string())])
+    with pyarrow.parquet.ParquetWriter(path, schema) as writer:
+        for record in results:
+            n = len(record["t"]); params = json.dumps(record["params"], sort_keys=True)
+            writer.write_table(pyarrow.table({
+                "run": [record["run"]] * n, "document": [record["document"]] * n,
+                "params_id": [record["params_id"]] * n, "params": [params] * n, "seed": [record["seed"]] * n,
+                "t": record["t"], "op": record["op"], "text": record["text"]}, schema=schema))
+            yield record
+
+
+def generate_timelines(documents, param_sets, output_path, runs=1, seed=0, workers=None, word_freq=None):
+    """
+    Simulates every document (file paths) under every parameter set (dicts of TIMELINE_PARAMS), runs
+    times each with distinct derived seeds, in a pool of workers (default: all CPUs). Writes one JSONL
+    record per run, or one Parquet row per edit if output_path ends in .parquet (needs pyarrow); the
+    file is replaced only once complete. Returns the number of runs written.
+    """
+    for params in param_sets:
+        unknown = set(params) - set(TIMELINE_PARAMS)
+        if unknown: raise ValueError(f"Unknown parameters: {', '.join(sorted(unknown))}")
+    parquet = output_path.lower().endswith(".parquet")
+    if parquet:
+        try: import pyarrow.parquet # noqa: F401
+        except ImportError: raise RuntimeError("Parquet output requires pyarrow (pip install pyarrow); use .jsonl instead.")
+    import concurrent.futures
+    if word_freq is None: word_freq = load_word_frequencies() # Built once here; workers load the cached file
+    tasks = [(run, d, p, param_sets[p], _timeline_seed(seed, run)) for run, (d, p, _) in enumerate(
+             (d, p, r) for d in range(len(documents)) for p in range(len(param_sets)) for r in range(runs))]
+    workers = max(1, min(workers or os.cpu_count() or 1, len(tasks) or 1))
+
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(output_path)), prefix=".tmp-")
+    os.close(fd); written = 0; events = 0; start = time.perf_counter()
+    try:
+        with concurrent.futures.ProcessPoolExecutor(workers, initializer=_init_timeline_worker,
+                                                    initargs=(word_freq, list(documents))) as pool:
+            results = pool.map(_run_timeline, tasks, chunksize=max(1, len(tasks) // (workers * 8)))
+            writer = _write_timelines_parquet if parquet else _write_timelines_jsonl
+            for record in writer(tmp_path, results):
+                written += 1; events += len(record["t"])
+                if written % 50 == 0 or written == len(tasks): print(f"Generated {written}/{len(tasks)} timelines...")
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        try: os.unlink(tmp_path)
+        except OSError: pass
+        raise
+    elapsed = time.perf_counter() - start
+    print(f"Wrote {written} timelines ({events} edits) to {output_path} in {format_duration(elapsed)} "
+          f"with {workers} worker(s), {written / elapsed if elapsed else 0:.1f} runs/s.")
+    return written
+
+
+# --- Startup Profiling ---
+
+_startup_timings = [] # (stage, seconds), reported by --profile-startup
+
+
+@contextlib.contextmanager
+def startup_stage(name):
+    """Times a startup stage for the --profile-startup report."""
+    start = time.perf_counter()
+    try: yield
+    finally: _startup_timings.append((name, time.perf_counter() - start))
+
+
+def print_startup_profile():
+    """Prints the time spent in each recorded startup stage."""
+    print("\n--- Startup Profile ---")
+    for name, seconds in _startup_timings: print(f"  {name:<24} {seconds * 1000:9.1f} ms")
+    print(f"  {'total':<24} {sum(s for _, s in _startup_timings) * 1000:9.1f} ms")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate human typing to build a plausible document revision history.")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="print import/verification time for each startup stage before typing starts")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="seed for the keystroke planner; the same seed and text reproduce a run exactly")
+    parser.add_argument("--input", metavar="PATH",
+                        help="stream the text from a file ('-' for stdin) instead of prompting; paragraphs are read "
+                             "and planned one at a time, so memory use does not grow with document size")
+    parser.add_argument("--vectorized", action="store_true",
+                        help="sample typing decisions in NumPy batches per paragraph (faster planning for large documents)")
+    parser.add_argument("--async", dest="async_engine", action="store_true",
+                        help="run on the asyncio engine: type p/r/c/s + Enter to pause, resume, cancel or show status, "
+                             "even during a break")
+    parser.add_argument("--checkpoint", metavar="PATH", default=None,
+                        help="where typing progress is saved while a session runs (default: in the cache directory)")
+    parser.add_argument("--resume", action="store_true",
+                        help="continue the interrupted session saved in the checkpoint; give the same text again")
+    parser.add_argument("--metrics-log", metavar="PATH",
+                        help="append session, break, error and progress events to PATH as JSON lines")
+    parser.add_argument("--metrics-prom", metavar="PATH",
+                        help="keep PATH updated with session counters in Prometheus text format")
+    batch = parser.add_argument_group("batch timeline generation (offline, no keyboard)")
+    batch.add_argument("--batch", nargs="+", metavar="DOC",
+                       help="simulate these text files and write their edit timelines instead of typing")
+    batch.add_argument("--batch-output", metavar="PATH", default="timelines.jsonl",
+                       help="output file: .jsonl (one run per line) or .parquet (one edit per row, needs pyarrow)")
+    batch.add_argument("--param-sets", metavar="JSON",
+                       help="JSON file with a list of parameter dicts to run every document under (default: engine defaults)")
+    batch.add_argument("--runs", type=int, default=1, help="runs per document and parameter set, each with its own seed")
+    batch.add_argument("--workers", type=int, default=None, help="worker processes (default: all CPUs)")
+    return parser.parse_args(argv)
 
 
 # --- Main Execution Logic ---
 
-def main():
+def main(argv=None):
+    args = parse_args(argv)
+
     # --- Ensure NLTK Data ---
-    ensure_nltk_data()
+    with startup_stage("verify NLTK data"): ensure_nltk_data()
+
+    # --- Batch Mode ---
+    if args.batch:
+        param_sets = [{}]
+        if args.param_sets:
+            try:
+                with open(args.param_sets, "r", encoding="utf-8") as f: param_sets = json.load(f)
+                if isinstance(param_sets, dict): param_sets = [param_sets]
+            except (OSError, ValueError) as e: print(f"Cannot read parameter sets: {e}"); return
+        try: generate_timelines(args.batch, param_sets, args.batch_output, args.runs, args.seed or 0, args.workers)
+        except (OSError, ValueError, RuntimeError) as e: print(f"Batch generation failed: {e}")
+        return
+
+    # --- Checkpoint ---
+    checkpoint_path = args.checkpoint or default_checkpoint_path(); checkpoint = None
+    if args.resume:
+        checkpoint = SessionCheckpoint.load(checkpoint_path)
+        if checkpoint is None: return
+    elif os.path.exists(checkpoint_path):
+        print(f"Note: An unfinished session is saved at {checkpoint_path}; this run replaces it (use --resume to continue it).")
 
     # --- Get Text Input ---
-    text = ""
-    print("\nEnter/Paste the text. Press Ctrl+D (Unix) or Ctrl+Z+Enter (Windows) when done.")
-    print("Alternatively, type 'END' on a new line to finish:")
-    lines = []
-    while True:
-        try: line = input(); lines.append(line)
-        except EOFError: print("\nEOF detected, finishing input."); break
-        except KeyboardInterrupt: print("\nInput interrupted. Exiting."); return
-        if line.strip().upper() == "END": lines.pop(); break
-    text = "\n".join(lines)
-    if not text.strip(): print("No text provided. Exiting."); return
+    text = ""; input_stream = None; input_lines = None
+    if args.input: # Streaming mode: paragraphs are read lazily while typing
+        try: input_stream = sys.stdin if args.input == "-" else open(args.input, "r", encoding="utf-8")
+        except OSError as e: print(f"Cannot open input file: {e}"); return
+        if args.input != "-": input_lines = HashingLines(input_stream)
+        text = iter_paragraphs(input_lines or input_stream)
+        print(f"\nStreaming text from {'stdin' if args.input == '-' else args.input}.")
+    else:
+        print("\nEnter/Paste the text. Press Ctrl+D (Unix) or Ctrl+Z+Enter (Windows) when done.")
+        print("Alternatively, type 'END' on a new line to finish:")
+        lines = []
+        while True:
+            try: line = input(); lines.append(line)
+            except EOFError: print("\nEOF detected, finishing input."); break
+            except KeyboardInterrupt: print("\nInput interrupted. Exiting."); return
+            if line.strip().upper() == "END": lines.pop(); break
+        text = "\n".join(lines)
+        if not text.strip(): print("No text provided. Exiting."); return
 
     # --- Parameters ---
     min_interval=1.5; max_interval=6; min_break=30; max_break=75; min_sentences=2; max_sentences=5
     long_break_prob=0.07; long_break_min=90; long_break_max=300; burst_prob=0.4; burst_length_min=2
     burst_length_max=4; typo_prob=0.02; capitalization_error_prob=0.03; typing_speed_factor=2
 
-    customize = input("Customize parameters (timing, errors, etc.)? (y/n, default n): ").strip().lower()
+    if checkpoint is not None: customize = 'n'; print("Using the parameters saved with the session.")
+    elif args.input == "-": customize = 'n'; print("Using default parameters (stdin carries the text).")
+    else: customize = input("Customize parameters (timing, errors, etc.)? (y/n, default n): ").strip().lower()
     if customize == 'y':
          print("--- Customizing Parameters ---")
          while True: # Input loop for customization
@@ -428,18 +2032,56 @@ def main():
 
     # --- Load Frequencies ---
     print("\nLoading word frequencies...")
-    word_freq = load_word_frequencies()
+    with startup_stage("load word frequencies"): word_freq = load_word_frequencies()
     if not word_freq or len(word_freq)<10: print("Word freq loading failed. Exiting."); sys.exit(1)
     print("Frequencies loaded.")
+    if args.profile_startup: # Otherwise nltk and pynput are imported where first used, as before
+        with startup_stage("import nltk"): importlib.import_module("nltk")
+        with startup_stage("import pynput"):
+            try: importlib.import_module("pynput.keyboard")
+            except Exception: pass # Reported when the keyboard controller is created
+        print_startup_profile()
+
+    # --- Session Identity ---
+    same_text = True
+    if args.input == "-": key = None # Can't be re-read; the checkpoint's character offset is still checked
+    elif args.input: # Only the first chunk is hashed up front; the lines are hashed as they stream (HashingLines)
+        try:
+            key = file_key(args.input)
+            if checkpoint is not None and checkpoint.read is not None and key == checkpoint.key:
+                with open(args.input, "r", encoding="utf-8") as f: same_text = read_matches(f, checkpoint.read)
+        except OSError as e: print(f"Cannot read input file: {e}"); return
+    else: key = document_key(text)
+    if checkpoint is not None:
+        if not same_text or key is not None and checkpoint.key is not None and key != checkpoint.key:
+            print("The text differs from the one in the checkpoint; not resuming."); return
+        params = checkpoint.params; seed = checkpoint.seed
+    else:
+        params = dict(min_interval=min_interval, max_interval=max_interval, min_break=min_break, max_break=max_break,
+                      min_sentences_per_session=min_sentences, max_sentences_per_session=max_sentences,
+                      long_break_prob=long_break_prob, long_break_min=long_break_min, long_break_max=long_break_max,
+                      burst_prob=burst_prob, burst_length_min=burst_length_min, burst_length_max=burst_length_max,
+                      typo_prob=typo_prob, capitalization_error_prob=capitalization_error_prob,
+                      typing_speed_factor=typing_speed_factor, vectorized=args.vectorized)
+        seed = args.seed if args.seed is not None else random.randrange(2**32)
+        checkpoint = SessionCheckpoint(checkpoint_path, key, seed, params)
+    checkpoint.source = input_lines
 
     # --- Run Simulation ---
     try:
-        falsify_google_docs_history(text, word_freq, min_interval, max_interval, min_break, max_break,
-                                    min_sentences, max_sentences, long_break_prob, long_break_min,
-                                    long_break_max, burst_prob, burst_length_min, burst_length_max,
-                                    typo_prob, capitalization_error_prob, typing_speed_factor)
+        metrics = SessionMetrics(args.metrics_log, args.metrics_prom) if args.metrics_log or args.metrics_prom else None
+        if args.async_engine:
+            import asyncio
+            asyncio.run(falsify_google_docs_history_async(text, word_freq, **params, seed=seed, checkpoint=checkpoint,
+                                                          metrics=metrics, commands=args.input != "-"))
+        else: falsify_google_docs_history(text, word_freq, **params, seed=seed, checkpoint=checkpoint, metrics=metrics)
     except KeyboardInterrupt: print("\nTyping interrupted by user.")
+    except PlanVerificationError as e: print(f"\nStopped: the keystroke plan would not reproduce the text. {e}")
     except Exception as e: print(f"\nUnexpected error during simulation: {e}"); traceback.print_exc()
+    finally:
+        if input_stream is not None and input_stream is not sys.stdin: input_stream.close()
+
+_startup_timings.append(("import docusim", time.perf_counter() - _IMPORT_START))
 
 if __name__ == "__main__":
     main()
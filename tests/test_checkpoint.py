@@ -0,0 +1,22 @@
+import io
+
+import docusim
+
+
+def test_resume_checks_every_line_read_but_not_the_rest(tmp_path):
+    path = tmp_path / "doc.txt"; text = "First line.\n" + "x" * (2 << 20) + "\nMiddle.\nLast line.\n"
+    path.write_text(text)
+    lines = docusim.HashingLines(open(path, encoding="utf-8"))
+    paragraphs = docusim.iter_paragraphs(lines)
+    for _ in range(3): next(paragraphs)
+    read = lines.state; lines.stream.close(); key = docusim.file_key(path)
+    assert read[0] == 3
+
+    # Same size and first chunk, but a line that was already read changed
+    path.write_text(text.replace("Middle.", "Muddle."))
+    assert docusim.file_key(path) == key and not docusim.read_matches(open(path, encoding="utf-8"), read)
+
+    # Only lines not read yet changed: the session can carry on
+    path.write_text(text.replace("Last line.", "Past line."))
+    assert docusim.file_key(path) == key and docusim.read_matches(open(path, encoding="utf-8"), read)
+    assert docusim.read_matches(io.StringIO(text), read) and not docusim.read_matches(io.StringIO("First line.\n"), read)
@@ -0,0 +1,20 @@
+import docusim
+
+
+def test_replay_types_plan_events_and_records_anomalies():
+    plan = docusim.KeystrokePlan()
+    plan.key(docusim.KEY_BACKSPACE) # Nothing to delete yet
+    for char in "Helo": plan.key(char, 0.1)
+    plan.key(docusim.KEY_BACKSPACE); plan.add(docusim.EV_WAIT, 0, 2.0)
+    for char in "lo": plan.key(char)
+    plan.key(docusim.KEY_SPACE); plan.add(docusim.EV_BREAK, 0, 60.0); plan.key(docusim.KEY_ENTER)
+    plan.add(docusim.EV_PRESS, ord("x"))
+
+    document = docusim.ReplayDocument(capacity=2).replay(plan) # Grows the buffer several times
+    assert document.text() == "Hello \nx" and len(document) == 8
+    assert document.underflow == 1 and document.unreleased == [(len(plan) - 1, ord("x"), 7)]
+
+    # Replaying in pieces gives the same document
+    pieces = docusim.ReplayDocument(capacity=2)
+    for start in range(0, len(plan), 3): pieces.replay(plan, start, min(start + 3, len(plan)))
+    assert pieces.text() == document.text() and pieces.unreleased == document.unreleased
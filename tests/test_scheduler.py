@@ -0,0 +1,41 @@
+import asyncio
+
+import docusim
+
+
+class StallingClock(docusim.VirtualClock):
+    """VirtualClock whose sleep takes stall extra seconds once, the first time it is asked to."""
+    stall = 0.0
+
+    def sleep(self, seconds):
+        super().sleep(seconds + self.stall); self.stall = 0.0
+
+
+def _gaps(clock, wait, delays):
+    times = []
+    for delay in delays: wait(delay); times.append(clock.monotonic())
+    return [b - a for a, b in zip(times, times[1:])]
+
+
+def test_small_lateness_is_made_up_by_the_next_deadlines():
+    clock = StallingClock(); scheduler = docusim.DeadlineScheduler(clock, timer_resolution=0.001)
+    scheduler.wait(0.1); clock.stall = 0.05; scheduler.wait(0.1) # 50 ms late
+    assert abs(scheduler.wait(0.1)) < 1e-9 and abs(clock.monotonic() - 0.3) < 1e-9 and scheduler.reanchors == 0
+
+
+def test_stall_re_anchors_instead_of_firing_back_to_back():
+    clock = StallingClock(); scheduler = docusim.DeadlineScheduler(clock, timer_resolution=0.001)
+    scheduler.wait(0.1); clock.stall = 5.0
+    gaps = _gaps(clock, scheduler.wait, [0.1] * 10) # The first wait overruns by five seconds
+    assert gaps == [gaps[0]] * 9 and abs(gaps[0] - 0.1) < 1e-9 # Spacing kept after the stall, no burst
+    assert scheduler.reanchors == 1 and scheduler.stats()["drift"] > 4.9
+
+
+def test_async_wait_re_anchors_too():
+    clock = StallingClock(); scheduler = docusim.DeadlineScheduler(clock, timer_resolution=0.001)
+
+    async def run():
+        await scheduler.wait_async(0.1); clock.stall = 5.0; await scheduler.wait_async(0.1)
+        before = clock.monotonic(); await scheduler.wait_async(0.1); return clock.monotonic() - before
+
+    assert abs(asyncio.run(run()) - 0.1) < 1e-9 and scheduler.reanchors == 1
@@ -0,0 +1,28 @@
+import docusim
+
+
+def _make_nltk_data(root):
+    brown = root / "corpora" / "brown"; brown.mkdir(parents=True)
+    (brown / "cats.txt").write_text("ca01 news\n")
+    (brown / "ca01").write_text("\n\n\tThe/at cat/nn sat/vbd ./.\n\n\tThe/at cat/nn ran/vbd ./.\n")
+    words = root / "corpora" / "words"; words.mkdir()
+    (words / "README").write_text("Word lists\n"); (words / "en").write_text("cat\ndog\n")
+    (root / "tokenizers" / "punkt").mkdir(parents=True)
+
+
+def test_table_is_rebuilt_when_a_corpus_file_changes(tmp_path, monkeypatch):
+    import nltk
+    data = tmp_path / "nltk_data"; _make_nltk_data(data)
+    monkeypatch.setenv("NLTK_DATA", str(data)); monkeypatch.setenv("DOCUSIM_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(nltk.data, "path", [str(data)])
+    builds = []; build = docusim._build_word_frequencies
+    monkeypatch.setattr(docusim, "_build_word_frequencies", lambda: builds.append(1) or build())
+
+    table = docusim.load_word_frequencies()
+    assert table.get("cat") == 2 and "dog" not in table
+    assert len(docusim.load_word_frequencies()) == len(table) and len(builds) == 1 # Unchanged: cached table
+
+    # Edit a Brown data file in place: the probe file (cats.txt) and the directory listing don't change
+    (data / "corpora" / "brown" / "ca01").write_text("\n\n\tThe/at dog/nn sat/vbd ./.\n\n\tThe/at dog/nn barked/vbd ./.\n")
+    table = docusim.load_word_frequencies()
+    assert len(builds) == 2 and table.get("dog") == 2 and "cat" not in table